@@ -0,0 +1,160 @@
+"""
+Benchmark ponta a ponta: gera dados sintéticos, roda IngestionEngine e
+ReportGenerator contra o Postgres local e imprime o resultado em JSON.
+
+Uso (com o Postgres do docker-compose no ar, a partir da raiz do projeto):
+    python -m benchmarks.bench_pipeline --days 3 --rows-per-day 200000 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.generate_data import add_generator_args, generate, generator_kwargs
+from src.database import Database
+from src.ingestion import IngestionEngine
+from src.reporting import ReportGenerator
+
+BENCH_SUFFIX = "_bench"
+
+
+def peak_rss_mb():
+    # ru_maxrss é em KB no Linux; inclui workers do pool de processos
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def cleanup(db, start_date, end_date):
+    # Remove tudo que o benchmark carregou (datas sintéticas + nomes *_bench)
+    with db.connection() as conn:
+        cur = conn.cursor()
+        # Lojas placeholder criadas pelas vendas de loja desconhecida do gerador
+        # (antes do delete do fato, que é o que as identifica)
+        cur.execute("""
+            DELETE FROM analytics.dim_stores d
+            WHERE d.store_name = 'Unknown store'
+              AND EXISTS (
+                  SELECT 1 FROM analytics.fact_sales f
+                  WHERE f.store_token = d.store_token
+                    AND f.transaction_time >= %s AND f.transaction_time < %s
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM analytics.fact_sales f
+                  WHERE f.store_token = d.store_token
+                    AND (f.transaction_time < %s OR f.transaction_time >= %s)
+              );
+        """, (start_date, end_date, start_date, end_date))
+        cur.execute("""
+            DELETE FROM analytics.fact_sales
+            WHERE transaction_time >= %s AND transaction_time < %s;
+        """, (start_date, end_date))
+        cur.execute("DELETE FROM analytics.agg_store_daily_sales WHERE sales_date >= %s AND sales_date < %s;",
+                    (start_date, end_date))
+        cur.execute("DELETE FROM analytics.agg_daily_sales WHERE sales_date >= %s AND sales_date < %s;",
+                    (start_date, end_date))
+        cur.execute("DELETE FROM analytics.sys_batch_log WHERE file_name LIKE %s;",
+                    (f"%{BENCH_SUFFIX}.csv",))
+        cur.execute("DELETE FROM analytics.dim_stores WHERE store_name LIKE %s;", ("Bench Store %",))
+        conn.commit()
+
+
+def timed(stages, name, fn):
+    start = time.perf_counter()
+    result = fn()
+    stages[name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_generator_args(parser)
+    parser.add_argument("--load-mode", choices=["copy", "rows"], default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--keep", action="store_true", help="não apaga os dados carregados")
+    parser.add_argument("--output", help="arquivo JSON de saída (além do stdout)")
+    args = parser.parse_args()
+
+    gen_kwargs = generator_kwargs(args)
+    end_date = args.start_date + timedelta(days=args.days)
+    db = Database()
+    stages = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        inbox = os.path.join(workdir, "inbox")
+        files = timed(stages, "generate",
+                      lambda: generate(inbox, suffix=BENCH_SUFFIX, **gen_kwargs))
+
+        engine = IngestionEngine(load_mode=args.load_mode, db=db, force_reload=True)
+        if args.workers is not None:
+            engine.workers = args.workers
+        engine.inbox_path = inbox + "/"
+        engine.history_path = os.path.join(workdir, "history") + "/"
+        engine.rejected_path = os.path.join(workdir, "rejected") + "/"
+        engine.quarantine_path = os.path.join(workdir, "quarantine") + "/"
+        # O archive Parquet não entra na medida (nem deixa arquivos em data/archive/)
+        engine.archive_enabled = False
+        for path in (engine.history_path, engine.rejected_path, engine.quarantine_path):
+            os.makedirs(path, exist_ok=True)
+
+        reporter = ReportGenerator(db=db)
+        reporter.output_path = os.path.join(workdir, "output") + "/"
+        # Sempre gera (mede o relatório, não o cache) e não grava no cache de data/output/
+        reporter.cache_enabled = False
+        os.makedirs(reporter.output_path, exist_ok=True)
+
+        cleanup(db, args.start_date, end_date)
+        try:
+            results = timed(stages, "ingest", engine.process_inbox)
+            timed(stages, "report", reporter.generate_all)
+        finally:
+            if not args.keep:
+                cleanup(db, args.start_date, end_date)
+            db.close()
+
+    input_rows = sum(f["rows"] for f in files)
+    # Vazão pelo que foi de fato carregado; arquivo FAILED invalida a medida
+    loaded_rows = sum(r["rows"] for r in results)
+    failed = [r["file"] for r in results if r["status"] == "FAILED"]
+    result = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {k: str(v) for k, v in gen_kwargs.items()},
+        "load_mode": engine.load_mode,
+        "workers": engine.workers,
+        "files": files,
+        "input_rows": input_rows,
+        "loaded_rows": loaded_rows,
+        "failed_files": failed,
+        "stages_seconds": stages,
+        "ingest_rows_per_second": round(loaded_rows / stages["ingest"]) if stages["ingest"] and not failed else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    out = json.dumps(result, indent=2)
+    print(out)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out + "\n")
+    if failed:
+        print(f"FAILED files: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
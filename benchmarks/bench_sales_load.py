@@ -0,0 +1,113 @@
+"""
+Compara o throughput (linhas/s) do load de vendas: modos 'rows' e 'copy'
+e, no modo copy, os parsers 'pandas' e 'csv' (sem DataFrame).
+
+Uso (com o Postgres do docker-compose no ar, a partir da raiz do projeto):
+    python -m benchmarks.bench_sales_load --rows 100000
+    python -m benchmarks.bench_sales_load --rows 1000000 --modes copy --memory
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from benchmarks.generate_data import random_uuid, write_sales
+from src.ingestion import IngestionEngine
+
+BENCH_DATE = "19000101"
+BENCH_DAY = date(1900, 1, 1)
+BENCH_STORE_NAME = "Bench Store"
+
+
+def bench_stores():
+    rng = random.Random(42)
+    return [random_uuid(rng) for _ in range(50)]
+
+
+def write_sales_file(path, n_rows, stores):
+    rng = random.Random(43)
+    write_sales(path, BENCH_DAY, n_rows, stores, rng,
+                invalid_ratio=0, duplicate_ratio=0, unknown_store_ratio=0)
+
+
+def setup(engine, stores):
+    # Lojas do benchmark em dim_stores: sem elas, unknown_store_policy desviaria todas as vendas
+    with engine.db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO analytics.dim_stores (store_token, store_name)
+            SELECT token, %s FROM unnest(%s::uuid[]) AS t(token)
+            ON CONFLICT (store_token) DO NOTHING;
+        """, (BENCH_STORE_NAME, stores))
+        conn.commit()
+
+
+def cleanup(engine, stores):
+    # Tudo que o load deixa: fato, agregados do dia, batch log e as lojas do benchmark
+    with engine.db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM analytics.fact_sales WHERE batch_date = %s;", (BENCH_DATE,))
+        cur.execute("DELETE FROM analytics.agg_store_daily_sales WHERE sales_date = %s;", (BENCH_DAY,))
+        cur.execute("DELETE FROM analytics.agg_daily_sales WHERE sales_date = %s;", (BENCH_DAY,))
+        cur.execute("DELETE FROM analytics.sys_batch_log WHERE file_name LIKE %s;",
+                    (f"sales_{BENCH_DATE}_bench%",))
+        cur.execute("DELETE FROM analytics.dim_stores WHERE store_token = ANY(%s::uuid[]);", (stores,))
+        conn.commit()
+
+
+def run(mode, parser, inbox, n_rows, stores, memory=False):
+    engine = IngestionEngine(load_mode=mode)
+    engine.inbox_path = inbox
+    engine.parser = parser
+    # O archive Parquet não entra na medida (nem deixa arquivos para trás)
+    engine.archive_enabled = False
+    filename = f"sales_{BENCH_DATE}_bench_{mode}_{parser}.csv"
+    write_sales_file(os.path.join(inbox, filename), n_rows, stores)
+
+    cleanup(engine, stores)
+    setup(engine, stores)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    valid_rows = engine._process_sales(filename)
+    elapsed = time.perf_counter() - start
+    peak_mb = None
+    if memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    cleanup(engine, stores)
+
+    label = f"{mode}/{parser}"
+    line = f"{label:>11}: {valid_rows} rows in {elapsed:.2f}s -> {valid_rows / elapsed:,.0f} rows/s"
+    if peak_mb is not None:
+        line += f", peak {peak_mb:,.1f} MB (tracemalloc)"
+    print(line)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--modes", nargs="+", default=["rows", "copy"])
+    parser.add_argument("--parsers", nargs="+", default=["pandas", "csv"],
+                        help="parsers comparados no modo copy (o modo rows usa sempre pandas)")
+    parser.add_argument("--memory", action="store_true",
+                        help="mede o pico de memória com tracemalloc (deixa o load mais lento)")
+    args = parser.parse_args()
+
+    stores = bench_stores()
+    runs = [(mode, p) for mode in args.modes for p in (args.parsers if mode == "copy" else ["pandas"])]
+    with tempfile.TemporaryDirectory() as inbox:
+        results = {run_: run(*run_, inbox, args.rows, stores, args.memory) for run_ in runs}
+
+    if ("rows", "pandas") in results and ("copy", "pandas") in results:
+        print(f"speedup copy vs rows: {results[('rows', 'pandas')] / results[('copy', 'pandas')]:.1f}x")
+    if ("copy", "pandas") in results and ("copy", "csv") in results:
+        print(f"speedup csv vs pandas parser: {results[('copy', 'pandas')] / results[('copy', 'csv')]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
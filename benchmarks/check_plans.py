@@ -0,0 +1,96 @@
+"""
+Confere os planos dos relatórios: roda EXPLAIN (ANALYZE, BUFFERS, VERBOSE)
+em cada query do ReportGenerator e falha (exit 1) quando algum plano faz
+Seq Scan numa tabela maior que plan_check.max_seq_scan_rows.
+
+Uso (com o Postgres do docker-compose no ar, a partir da raiz do projeto):
+    python -m benchmarks.check_plans
+    python -m benchmarks.check_plans --reports top_stores --max-rows 50000 --verbose
+"""
+import argparse
+import json
+import sys
+
+from src.database import Database
+from src.reporting import REPORTS, ReportGenerator
+
+TABLE_ROWS_SQL = """
+    SELECT c.reltuples::bigint
+    FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relname = %s;
+"""
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(cur, query):
+    # VERBOSE: sem ele o nó não traz 'Schema' (só 'Relation Name')
+    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) {query.strip().rstrip(';')}")
+    plan = cur.fetchone()[0]
+    # psycopg2 já devolve json como objeto; texto em versões antigas do driver
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+
+
+def table_rows(cur, schema, relation):
+    # Estimativa do pg_class. Tabela nunca analisada (-1; 0 antes do Postgres 14)
+    # cai no COUNT(*) exato, senão o limite passaria sem checar nada
+    cur.execute(TABLE_ROWS_SQL, (schema, relation))
+    row = cur.fetchone()
+    if row and row[0] > 0:
+        return row[0]
+    cur.execute(f'SELECT COUNT(*) FROM "{schema}"."{relation}";')
+    return cur.fetchone()[0]
+
+
+def seq_scans(cur, plan, max_rows):
+    """Seq Scans em tabelas com mais de `max_rows` linhas."""
+    found = []
+    for node in plan_nodes(plan['Plan']):
+        if node['Node Type'] != 'Seq Scan':
+            continue
+        schema = node['Schema']
+        rows = table_rows(cur, schema, node['Relation Name'])
+        if rows > max_rows:
+            found.append((f"{schema}.{node['Relation Name']}", rows))
+    return found
+
+
+def main():
+    db = Database()
+    cfg = db.config.get('plan_check') or {}
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", nargs="+", choices=list(REPORTS), default=list(REPORTS))
+    parser.add_argument("--max-rows", type=int, default=int(cfg.get('max_seq_scan_rows', 100000)),
+                        help="maior tabela (linhas) em que um Seq Scan ainda é aceito")
+    parser.add_argument("--verbose", action="store_true", help="imprime o plano completo")
+    args = parser.parse_args()
+
+    reporter = ReportGenerator(db=db)
+    failures = 0
+    try:
+        with db.connection() as conn:
+            cur = conn.cursor()
+            for name, (query, filename) in zip(args.reports, reporter.queries(args.reports)):
+                plan = explain(cur, query)
+                conn.rollback()
+                if args.verbose:
+                    print(json.dumps(plan, indent=2))
+                offenders = seq_scans(cur, plan, args.max_rows)
+                buffers = plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+                status = "FAIL" if offenders else "ok"
+                print(f"{status:>4} {name} ({filename}): {plan['Execution Time']:.1f} ms, {buffers} buffers")
+                for table, rows in offenders:
+                    print(f"     Seq Scan on {table} (~{rows} rows > {args.max_rows})")
+                failures += bool(offenders)
+    finally:
+        db.close()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
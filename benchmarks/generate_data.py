@@ -0,0 +1,150 @@
+"""
+Gera arquivos sintéticos stores_*.csv e sales_*.csv no formato do inbox.
+
+Uso:
+    python -m benchmarks.generate_data --out data/inbox --days 3 --rows-per-day 100000
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import date, datetime, timedelta
+
+SALES_HEADER = "store_token,transaction_id,receipt_token,transaction_time,amount,user_role\n"
+STORES_HEADER = "store_group,store_token,store_name\n"
+USER_ROLES = ["Cashier", "Manager", "Supervisor"]
+
+
+def random_uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def write_stores(path, store_tokens):
+    with open(path, "w") as f:
+        f.write(STORES_HEADER)
+        for i, token in enumerate(store_tokens):
+            f.write(f"{token[:8].upper()},{token},Bench Store {i}\n")
+
+
+def invalid_row(rng, store_token, day):
+    # Um defeito por linha, no formato que chega do upstream
+    kind = rng.choice(["amount", "store_token", "transaction_id", "transaction_time"])
+    tx_id = random_uuid(rng)
+    ts = f"{day} 12:00:00"
+    amount = f"${rng.uniform(1, 500):.2f}"
+    if kind == "amount":
+        # Vírgula entre aspas: um campo só, como um CSV válido traria
+        amount = rng.choice(["$", "N/A", '"$12,34.5"', ""])
+    elif kind == "store_token":
+        store_token = "not-a-token"
+    elif kind == "transaction_id":
+        tx_id = tx_id[:-4]
+    else:
+        ts = rng.choice(["", "yesterday", "2025-13-45 99:00:00"])
+    return f"{store_token},{tx_id},REC-BAD,{ts},{amount},Cashier\n"
+
+
+def write_sales(path, day, n_rows, store_tokens, rng,
+                invalid_ratio=0.01, duplicate_ratio=0.005, unknown_store_ratio=0.005):
+    """
+    Escreve `n_rows` vendas para `day`, com a proporção pedida de linhas
+    inválidas, transaction_id repetido e lojas fora de dim_stores.
+    Retorna contadores do que foi gerado.
+    """
+    counts = {"rows": 0, "invalid": 0, "duplicates": 0, "unknown_store": 0}
+    recent = []
+    day_start = datetime(day.year, day.month, day.day)
+
+    with open(path, "w") as f:
+        f.write(SALES_HEADER)
+        for i in range(n_rows):
+            store_token = rng.choice(store_tokens)
+            roll = rng.random()
+
+            if roll < invalid_ratio:
+                f.write(invalid_row(rng, store_token, day))
+                counts["invalid"] += 1
+                counts["rows"] += 1
+                continue
+            roll -= invalid_ratio
+
+            if roll < duplicate_ratio and recent:
+                store_token, tx_id = rng.choice(recent)
+                counts["duplicates"] += 1
+            else:
+                if duplicate_ratio <= roll < duplicate_ratio + unknown_store_ratio:
+                    store_token = random_uuid(rng)
+                    counts["unknown_store"] += 1
+                tx_id = random_uuid(rng)
+                if len(recent) < 1000:
+                    recent.append((store_token, tx_id))
+                else:
+                    recent[rng.randrange(1000)] = (store_token, tx_id)
+
+            ts = day_start + timedelta(seconds=rng.randrange(86400))
+            f.write(
+                f"{store_token},{tx_id},REC{i},{ts:%Y-%m-%d %H:%M:%S},"
+                f"${rng.uniform(1, 500):.2f},{rng.choice(USER_ROLES)}\n"
+            )
+            counts["rows"] += 1
+    return counts
+
+
+def generate(out_dir, start_date, days, rows_per_day, n_stores=200, seed=42,
+             invalid_ratio=0.01, duplicate_ratio=0.005, unknown_store_ratio=0.005,
+             suffix=""):
+    """
+    Gera um stores_<start>.csv e um sales_<dia>.csv por dia em `out_dir`.
+    `suffix` entra depois da data no nome (ex.: sales_19000101_bench.csv).
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    store_tokens = [random_uuid(rng) for _ in range(n_stores)]
+
+    files = []
+    stores_file = f"stores_{start_date:%Y%m%d}{suffix}.csv"
+    write_stores(os.path.join(out_dir, stores_file), store_tokens)
+    files.append({"file": stores_file, "rows": n_stores})
+
+    for d in range(days):
+        day = start_date + timedelta(days=d)
+        sales_file = f"sales_{day:%Y%m%d}{suffix}.csv"
+        counts = write_sales(
+            os.path.join(out_dir, sales_file), day, rows_per_day, store_tokens, rng,
+            invalid_ratio, duplicate_ratio, unknown_store_ratio
+        )
+        files.append({"file": sales_file, **counts})
+    return files
+
+
+def add_generator_args(parser):
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(1900, 1, 1))
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--rows-per-day", type=int, default=100000)
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--invalid-ratio", type=float, default=0.01)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.005)
+    parser.add_argument("--unknown-store-ratio", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def generator_kwargs(args):
+    return dict(
+        start_date=args.start_date, days=args.days, rows_per_day=args.rows_per_day,
+        n_stores=args.stores, seed=args.seed, invalid_ratio=args.invalid_ratio,
+        duplicate_ratio=args.duplicate_ratio, unknown_store_ratio=args.unknown_store_ratio
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default="data/inbox")
+    add_generator_args(parser)
+    args = parser.parse_args()
+
+    for f in generate(args.out, **generator_kwargs(args)):
+        print(f)
+
+
+if __name__ == "__main__":
+    main()
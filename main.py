@@ -1,27 +1,136 @@
-from src.ingestion import IngestionEngine
-from src.reporting import ReportGenerator
-import time
+import argparse
+from datetime import date
+
+# Só stdlib/yaml no topo: pandas (ingestão) e psycopg2 (banco) são importados
+# pelo comando que precisa deles, então `report` e `--help` sobem rápido
+from src.reporting import REPORTS
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Data pipeline: ingestão do inbox + relatórios")
+    parser.add_argument("--watch", action="store_true",
+                        help="modo contínuo: observa data/inbox/ e ingere cada arquivo ao chegar")
+    parser.add_argument("--replay", nargs=2, metavar=("FROM", "TO"), type=date.fromisoformat,
+                        help="reconstrói fact_sales entre FROM e TO (YYYY-MM-DD) a partir do archive Parquet")
+    commands = parser.add_subparsers(dest="command", metavar="{ingest,report}",
+                                     help="sem comando: ingestão seguida de todos os relatórios")
+
+    ingest = commands.add_parser("ingest", help="só a ingestão do inbox")
+    ingest.add_argument("--dry-run", action="store_true",
+                        help="só lê e valida os arquivos (sem banco, sem mover nada)")
+    ingest.add_argument("--force-reload", action="store_true",
+                        help="recarrega arquivos já registrados no sys_batch_log")
+
+    report = commands.add_parser("report", help="só os relatórios")
+    # Sem choices=: com nargs="*" o argparse recusa a lista vazia; validado em main()
+    report.add_argument("names", nargs="*", metavar="REPORT",
+                        help=f"relatórios a gerar ({', '.join(REPORTS)}); padrão: todos")
+    report.add_argument("--from", dest="date_from", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="primeiro dia do backfill (CSV com sufixo de datas)")
+    report.add_argument("--to", dest="date_to", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="último dia do backfill")
+    report.add_argument("--force", action="store_true",
+                        help="regera mesmo sem dados novos (ignora o cache de relatórios)")
+    return parser
+
+
+def run_ingest(db, dry_run=False, force_reload=False):
+    from src.ingestion import IngestionEngine
+
+    ingestor = IngestionEngine(db=db, force_reload=force_reload or None)
+    if dry_run:
+        results = ingestor.dry_run()
+    else:
+        results = ingestor.process_inbox()
+    return all(r['status'] != 'FAILED' for r in results)
+
+
+def run_reports(db, names=REPORTS, force=False, date_from=None, date_to=None):
+    from src.reporting import ReportGenerator
+
+    return ReportGenerator(db=db, date_from=date_from, date_to=date_to).generate(names, force=force)
+
 
 def main():
+    args = build_parser().parse_args()
+    command = args.command
+
+    if command == "report":
+        unknown = [name for name in args.names if name not in REPORTS]
+        if unknown:
+            print(f"Unknown reports: {', '.join(unknown)} (choose from {', '.join(REPORTS)})")
+            return 2
+        if args.date_from and args.date_to and args.date_from > args.date_to:
+            print(f"--from {args.date_from} is after --to {args.date_to}")
+            return 2
+
     print("--- Starting Data Pipeline ---")
+
+    from src.database import Database
+    from src.metrics import metrics
+
+    # Um único pool de conexões para ingestão e relatórios
+    db = Database()
+    # --dry-run não escreve nada: sem log de métricas nem arquivo .prom
+    dry_run = command == "ingest" and args.dry_run
+    if not dry_run:
+        metrics.configure(db.config.get('metrics'))
+    ok = True
     
-    # 1. Ingest Data (Extract & Load)
-    try:
-        ingestor = IngestionEngine()
-        ingestor.process_inbox()
-    except Exception as e:
-        print(f"Ingestion failed: {e}")
-        return
-    
-    # 2. Transform & Report
     try:
-        reporter = ReportGenerator()
-        reporter.generate_all()
-    except Exception as e:
-        print(f"Reporting failed: {e}")
+        if args.watch:
+            from src.ingestion import IngestionEngine
+            from src.reporting import ReportGenerator
+            from src.watcher import InboxWatcher
+            InboxWatcher(IngestionEngine(db=db), ReportGenerator(db=db)).run()
+            return 0
+
+        if args.replay:
+            from src.ingestion import IngestionEngine
+            IngestionEngine(db=db).replay_archive(*args.replay)
+            # Replay não passa pelo sys_batch_log: a marca d'água não muda
+            return 0 if run_reports(db, force=True) else 1
+
+        # Sem comando: ingestão + todos os relatórios, como sempre
+        ingest = command in (None, "ingest")
+        names, report_options, force = [], {}, False
+        force_reload = command == "ingest" and args.force_reload
+        if command is None:
+            names = list(REPORTS)
+        elif command == "report":
+            names = args.names or list(REPORTS)
+            report_options = {'date_from': args.date_from, 'date_to': args.date_to}
+            force = args.force
+
+        if (db.config.get('ingestion') or {}).get('engine') == 'async' and not dry_run:
+            from src.async_engine import run_pipeline
+            ok = run_pipeline(db, ingest=ingest, reports=names, force=force,
+                              force_reload=force_reload, **report_options)
+            return 0 if ok else 1
+
+        # 1. Ingest Data (Extract & Load)
+        if ingest:
+            try:
+                ok = run_ingest(db, dry_run=dry_run, force_reload=force_reload)
+            except Exception as e:
+                print(f"Ingestion failed: {e}")
+                return 1
+        
+        # 2. Transform & Report
+        if names:
+            try:
+                ok = run_reports(db, names, force=force, **report_options) and ok
+            except Exception as e:
+                print(f"Reporting failed: {e}")
+                return 1
+    finally:
+        db.close()
+        metrics.print_summary()
+        if not dry_run:
+            metrics.write_prometheus()
     
-    print("--- Pipeline Finished Successfully ---")
+    print("--- Pipeline Finished Successfully ---" if ok else "--- Pipeline Finished With Errors ---")
+    return 0 if ok else 1
 
 if __name__ == "__main__":
-    # Pequeno delay para garantir que o DB subiu se rodar tudo junto
-    main()
\ No newline at end of file
+    raise SystemExit(main())
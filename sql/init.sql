@@ -8,9 +8,25 @@ CREATE TABLE IF NOT EXISTS analytics.sys_batch_log (
     processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     total_rows INT DEFAULT 0,
     valid_rows INT DEFAULT 0,
-    invalid_rows INT DEFAULT 0
+    invalid_rows INT DEFAULT 0,
+    duplicate_rows INT DEFAULT 0,
+    file_hash CHAR(64),
+    file_size BIGINT
 );
 
+-- Migração de bancos existentes
+ALTER TABLE analytics.sys_batch_log ADD COLUMN IF NOT EXISTS file_hash CHAR(64);
+ALTER TABLE analytics.sys_batch_log ADD COLUMN IF NOT EXISTS file_size BIGINT;
+ALTER TABLE analytics.sys_batch_log ADD COLUMN IF NOT EXISTS duplicate_rows INT DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_batch_log_fingerprint ON analytics.sys_batch_log(file_hash, file_size);
+
+-- Índices dos relatórios (src/reporting.py); conferidos por benchmarks/check_plans.py
+-- output_1: filtro por file_type + GROUP BY/ORDER BY batch_date, só do índice
+CREATE INDEX IF NOT EXISTS idx_batch_log_report ON analytics.sys_batch_log
+    (file_type, batch_date DESC) INCLUDE (total_rows, valid_rows, invalid_rows);
+-- Marca d'água do cache de relatórios: MAX(processed_at)
+CREATE INDEX IF NOT EXISTS idx_batch_log_processed_at ON analytics.sys_batch_log(processed_at);
+
 -- 2. Dimensão Lojas (SCD Type 1)
 CREATE TABLE IF NOT EXISTS analytics.dim_stores (
     store_token UUID PRIMARY KEY,
@@ -19,19 +35,65 @@ CREATE TABLE IF NOT EXISTS analytics.dim_stores (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- 3. Fato Vendas
+-- 3. Fato Vendas (particionada por mês; partições criadas pela ingestão, src/partitions.py)
+-- transaction_time faz parte da PK por exigência do particionamento; a unicidade
+-- de (store_token, transaction_id) é mantida pelo merge da ingestão, serializado
+-- por faixa de store_token entre workers (SALES_LOCK_SQL em src/ingestion.py).
+-- Bancos com a tabela antiga (não particionada): sql/migrate_partition_fact_sales.sql
 CREATE TABLE IF NOT EXISTS analytics.fact_sales (
     transaction_id UUID,
     store_token UUID,
     receipt_token VARCHAR(50),
-    transaction_time TIMESTAMP,
+    transaction_time TIMESTAMP NOT NULL,
     amount NUMERIC(12,2),
     user_role VARCHAR(50),
     batch_date DATE,
     loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (store_token, transaction_id)
-);
+    PRIMARY KEY (store_token, transaction_id, transaction_time)
+) PARTITION BY RANGE (transaction_time);
 
 -- Indexes
-CREATE INDEX IF NOT EXISTS idx_sales_time ON analytics.fact_sales(transaction_time);
-CREATE INDEX IF NOT EXISTS idx_sales_batch ON analytics.fact_sales(batch_date);
\ No newline at end of file
+-- BRIN em transaction_time: as vendas chegam em ordem de dia, então cada faixa de
+-- blocos cobre poucos dias; serve o refresh dos agregados e o replay (filtro por
+-- intervalo) com uma fração do custo de escrita/tamanho do btree.
+DROP INDEX IF EXISTS analytics.idx_sales_time;
+CREATE INDEX IF NOT EXISTS idx_sales_time_brin ON analytics.fact_sales USING brin (transaction_time);
+CREATE INDEX IF NOT EXISTS idx_sales_batch ON analytics.fact_sales(batch_date);
+
+-- 4. Rollup diário por loja (mantido incrementalmente pela ingestão)
+CREATE TABLE IF NOT EXISTS analytics.agg_store_daily_sales (
+    sales_date DATE,
+    store_token UUID,
+    total_sales NUMERIC(18,2) NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    PRIMARY KEY (sales_date, store_token)
+);
+
+-- output_3: faixa dos últimos N dias + loja/total, sem ir ao heap
+CREATE INDEX IF NOT EXISTS idx_agg_store_daily_report ON analytics.agg_store_daily_sales
+    (sales_date DESC) INCLUDE (store_token, total_sales);
+
+-- Carga inicial a partir do histórico já existente
+INSERT INTO analytics.agg_store_daily_sales (sales_date, store_token, total_sales, transaction_count)
+SELECT DATE(transaction_time), store_token, SUM(amount), COUNT(*)
+FROM analytics.fact_sales
+WHERE transaction_time IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (sales_date, store_token) DO NOTHING;
+
+-- 5. Agregado diário (mantido incrementalmente pela ingestão)
+CREATE TABLE IF NOT EXISTS analytics.agg_daily_sales (
+    sales_date DATE PRIMARY KEY,
+    active_stores INT NOT NULL,
+    total_sales NUMERIC(18,2) NOT NULL,
+    transaction_count BIGINT NOT NULL,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Carga inicial a partir do histórico já existente
+INSERT INTO analytics.agg_daily_sales (sales_date, active_stores, total_sales, transaction_count)
+SELECT DATE(transaction_time), COUNT(DISTINCT store_token), SUM(amount), COUNT(*)
+FROM analytics.fact_sales
+WHERE transaction_time IS NOT NULL
+GROUP BY 1
+ON CONFLICT (sales_date) DO NOTHING;
@@ -0,0 +1,60 @@
+-- Migração: analytics.fact_sales (heap único) -> particionada por mês.
+-- Idempotente: não faz nada se a tabela já for particionada.
+-- Rodar com a ingestão parada, depois do sql/init.sql (que traz as colunas novas do
+-- sys_batch_log e já cria idx_sales_time_brin na tabela antiga, renomeado abaixo):
+--   psql -h localhost -p 5433 -U admin -d assessment_db -f sql/init.sql
+--   psql -h localhost -p 5433 -U admin -d assessment_db -f sql/migrate_partition_fact_sales.sql
+
+BEGIN;
+
+DO $$
+DECLARE
+    m DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'analytics.fact_sales'::regclass) = 'p' THEN
+        RAISE NOTICE 'analytics.fact_sales já é particionada, nada a fazer';
+        RETURN;
+    END IF;
+
+    ALTER TABLE analytics.fact_sales RENAME TO fact_sales_legacy;
+    ALTER INDEX IF EXISTS analytics.idx_sales_time RENAME TO idx_sales_legacy_time;
+    ALTER INDEX IF EXISTS analytics.idx_sales_batch RENAME TO idx_sales_legacy_batch;
+    ALTER INDEX IF EXISTS analytics.idx_sales_time_brin RENAME TO idx_sales_legacy_time_brin;
+
+    CREATE TABLE analytics.fact_sales (
+        transaction_id UUID,
+        store_token UUID,
+        receipt_token VARCHAR(50),
+        transaction_time TIMESTAMP NOT NULL,
+        amount NUMERIC(12,2),
+        user_role VARCHAR(50),
+        batch_date DATE,
+        loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (store_token, transaction_id, transaction_time)
+    ) PARTITION BY RANGE (transaction_time);
+
+    CREATE INDEX idx_sales_time_brin ON analytics.fact_sales USING brin (transaction_time);
+    CREATE INDEX idx_sales_batch ON analytics.fact_sales(batch_date);
+
+    -- Uma partição por mês presente no histórico (mesmo nome que src/partitions.py usa)
+    FOR m IN
+        SELECT DISTINCT DATE_TRUNC('month', transaction_time)::date
+        FROM analytics.fact_sales_legacy
+        WHERE transaction_time IS NOT NULL
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE analytics.%I PARTITION OF analytics.fact_sales FOR VALUES FROM (%L) TO (%L)',
+            'fact_sales_' || to_char(m, 'YYYYMM'), m, (m + INTERVAL '1 month')::date
+        );
+    END LOOP;
+
+    INSERT INTO analytics.fact_sales
+    SELECT transaction_id, store_token, receipt_token, transaction_time,
+           amount, user_role, batch_date, loaded_at
+    FROM analytics.fact_sales_legacy
+    WHERE transaction_time IS NOT NULL;
+
+    RAISE NOTICE 'Migração concluída; conferir e depois DROP TABLE analytics.fact_sales_legacy';
+END $$;
+
+COMMIT;
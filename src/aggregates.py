@@ -0,0 +1,66 @@
+# Agregados mantidos pela ingestão: só os dias tocados por um batch são recalculados.
+
+# Serializa os refreshes entre transações concorrentes (workers paralelos):
+# quem pega o lock depois enxerga o commit de quem pegou antes.
+AGGREGATE_LOCK_KEY = 'analytics.aggregates'
+
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s));"
+
+# Dia x loja a partir de fact_sales. Delete + insert: lojas/dias sem vendas somem.
+STORE_DAILY_DELETE_SQL = """
+    DELETE FROM analytics.agg_store_daily_sales WHERE sales_date = ANY(%s::date[]);
+"""
+STORE_DAILY_INSERT_SQL = """
+    INSERT INTO analytics.agg_store_daily_sales
+    (sales_date, store_token, total_sales, transaction_count)
+    SELECT
+        DATE(transaction_time),
+        store_token,
+        SUM(amount),
+        COUNT(*)
+    FROM analytics.fact_sales
+    WHERE transaction_time >= %s
+      AND transaction_time < %s::date + 1
+      AND DATE(transaction_time) = ANY(%s::date[])
+    GROUP BY 1, 2;
+"""
+
+# Dia a partir do rollup por loja (precisa rodar depois dele).
+DAILY_DELETE_SQL = """
+    DELETE FROM analytics.agg_daily_sales WHERE sales_date = ANY(%s::date[]);
+"""
+DAILY_INSERT_SQL = """
+    INSERT INTO analytics.agg_daily_sales
+    (sales_date, active_stores, total_sales, transaction_count)
+    SELECT
+        sales_date,
+        COUNT(*),
+        SUM(total_sales),
+        SUM(transaction_count)
+    FROM analytics.agg_store_daily_sales
+    WHERE sales_date = ANY(%s::date[])
+    GROUP BY 1;
+"""
+
+
+def refresh_statements(dates):
+    """
+    (sql, params) que recalculam agg_store_daily_sales e agg_daily_sales
+    para `dates`, na ordem, com o lock na frente. Usado pelo engine
+    síncrono (refresh) e pelo assíncrono (src/async_engine.py).
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return []
+    return [
+        (LOCK_SQL, (AGGREGATE_LOCK_KEY,)),
+        (STORE_DAILY_DELETE_SQL, (dates,)),
+        (STORE_DAILY_INSERT_SQL, (dates[0], dates[-1], dates)),
+        (DAILY_DELETE_SQL, (dates,)),
+        (DAILY_INSERT_SQL, (dates,)),
+    ]
+
+
+def refresh(cur, dates):
+    for sql, params in refresh_statements(dates):
+        cur.execute(sql, params)
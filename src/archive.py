@@ -0,0 +1,133 @@
+# Arquivo colunar das vendas já limpas: Parquet (zstd) particionado por dia da venda.
+#   <root>/sales_date=2025-11-28/sales_20251128.parquet
+import os
+import re
+from datetime import date
+
+from src.readers import require_pyarrow
+
+PARTITION_PATTERN = re.compile(r"sales_date=(\d{4}-\d{2}-\d{2})$")
+
+
+def _sales_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('store_token', pa.string()),
+        ('transaction_id', pa.string()),
+        ('receipt_token', pa.string()),
+        ('transaction_time', pa.timestamp('us')),
+        ('amount', pa.float64()),
+        ('user_role', pa.string()),
+        ('batch_date', pa.date32()),
+    ])
+
+
+class SalesArchiveWriter:
+    """
+    Grava as linhas limpas de um arquivo de vendas, chunk a chunk, num
+    Parquet por dia de venda. Os arquivos ficam com sufixo .tmp até
+    commit() (chamado depois do commit no banco); abort() os descarta.
+    """
+
+    def __init__(self, root, stem, compression='zstd'):
+        require_pyarrow(stem)
+        self.root = root
+        self.stem = stem
+        self.compression = compression
+        self.schema = _sales_schema()
+        self._writers = {}  # dia -> (ParquetWriter, tmp_path, final_path)
+
+    def _writer(self, day):
+        import pyarrow.parquet as pq
+
+        if day not in self._writers:
+            part_dir = os.path.join(self.root, f"sales_date={day:%Y-%m-%d}")
+            os.makedirs(part_dir, exist_ok=True)
+            final_path = os.path.join(part_dir, f"{self.stem}.parquet")
+            tmp_path = f"{final_path}.tmp"
+            writer = pq.ParquetWriter(tmp_path, self.schema, compression=self.compression)
+            self._writers[day] = (writer, tmp_path, final_path)
+        return self._writers[day][0]
+
+    def write(self, sales):
+        import pyarrow as pa
+
+        for day, group in sales.groupby(sales['transaction_time'].dt.date, sort=False):
+            # user_role chega como category (src/schema.py); no archive é string simples
+            group = group.astype({'user_role': object})
+            table = pa.Table.from_pandas(group, schema=self.schema, preserve_index=False)
+            self._writer(day).write_table(table)
+
+    def write_rows(self, rows):
+        """
+        Mesmo que write(), para tuplas na ordem de SALES_COLUMNS
+        (transaction_time datetime, amount float, batch_date date), vindas
+        do parser sem pandas (src/streaming.py).
+        """
+        import pyarrow as pa
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[3].date(), []).append(row)
+        for day, day_rows in by_day.items():
+            columns = dict(zip(self.schema.names, map(list, zip(*day_rows))))
+            self._writer(day).write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def commit(self):
+        published = set()
+        for writer, tmp_path, final_path in self._writers.values():
+            writer.close()
+            os.replace(tmp_path, final_path)
+            published.add(final_path)
+        # Reentrega do mesmo arquivo: dias que a versão anterior cobria e esta não
+        for path in published_files(self.root, self.stem):
+            if path not in published:
+                os.remove(path)
+        self._writers = {}
+
+    def abort(self):
+        for writer, tmp_path, _ in self._writers.values():
+            writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._writers = {}
+
+
+def published_files(root, stem):
+    # Parquets de `stem` em todos os dias do archive
+    if not os.path.isdir(root):
+        return []
+    paths = (os.path.join(root, entry, f"{stem}.parquet")
+             for entry in os.listdir(root) if PARTITION_PATTERN.match(entry))
+    return [path for path in paths if os.path.exists(path)]
+
+
+def archived_files(root, date_from, date_to):
+    """
+    Arquivos do archive com dia de venda em [date_from, date_to], na ordem
+    em que foram ingeridos (nome do arquivo de origem, depois dia): no
+    replay, a versão mais recente de uma transação vence, como no load.
+    """
+    found = []
+    if not os.path.isdir(root):
+        return found
+    for entry in os.listdir(root):
+        match = PARTITION_PATTERN.match(entry)
+        if not match:
+            continue
+        day = date.fromisoformat(match.group(1))
+        if not (date_from <= day <= date_to):
+            continue
+        part_dir = os.path.join(root, entry)
+        for name in os.listdir(part_dir):
+            if name.endswith('.parquet'):
+                found.append((name, day, os.path.join(part_dir, name)))
+    return [path for _, _, path in sorted(found)]
+
+
+def read_archive_chunks(path, chunk_size):
+    require_pyarrow(path)
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
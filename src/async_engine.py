@@ -0,0 +1,325 @@
+import asyncio
+import os
+import time
+from contextlib import aclosing
+
+from src import aggregates, stores
+from src.ingestion import (
+    BATCH_LOG_SQL, FINGERPRINT_LOCK_SQL, FINGERPRINT_LOOKUP_SQL, PLACEHOLDER_STORES_SQL,
+    SALES_COPY_SQL, SALES_LOCK_SQL, SALES_MERGE_SQL, SALES_MOVED_SQL, SALES_STAGING_SQL,
+    STORES_COPY_SQL, STORES_MERGE_SQL, STORES_STAGING_SQL,
+    IngestionEngine, batch_log_params, file_fingerprint, is_deadlock, sales_copy_data, stores_copy_data,
+)
+from src.metrics import metrics
+from src.reporting import REPORTS, WATERMARK_SQL, ReportGenerator
+from src.stores import StoreCache
+
+
+def open_pool(db):
+    """
+    AsyncConnectionPool (psycopg 3) com os mesmos parâmetros do pool síncrono.
+    Cursores client-side: o SQL com %s é o mesmo do psycopg2 (inclusive DDL
+    como o ATTACH PARTITION, que não aceita parâmetros server-side).
+    """
+    try:
+        import psycopg
+        from psycopg_pool import AsyncConnectionPool
+    except ImportError:
+        raise ImportError("ingestion.engine 'async' requires psycopg 3: pip install 'psycopg[binary,pool]'")
+
+    kwargs = db._connect_kwargs()
+    kwargs['dbname'] = kwargs.pop('database')
+    kwargs['cursor_factory'] = psycopg.AsyncClientCursor
+    return AsyncConnectionPool(
+        min_size=db.pool_min, max_size=db.pool_max, kwargs=kwargs, open=False,
+        check=AsyncConnectionPool.check_connection if db.health_check else None,
+    )
+
+
+class AsyncIngestionEngine(IngestionEngine):
+    """
+    Mesma ingestão do IngestionEngine (modo 'copy'), em asyncio: os arquivos
+    rodam concorrentes em conexões do pool assíncrono e, dentro de cada
+    arquivo, o parse/validação do próximo chunk (numa thread) acontece
+    enquanto o COPY do chunk atual está no banco.
+    """
+
+    def __init__(self, pool, db=None, force_reload=None):
+        super().__init__(load_mode='copy', db=db, force_reload=force_reload)
+        self.async_pool = pool
+        self._store_cache_alock = asyncio.Lock()
+
+    async def process_inbox(self):
+        files = self.list_inbox()
+
+        if not files:
+            print("No files found in inbox.")
+            return []
+
+        return await self.process_files(files)
+
+    async def process_files(self, files):
+        self._make_dirs()
+        # Lojas antes das vendas: a dimensão precisa estar carregada primeiro
+        stores_files = [f for f in files if "stores" in f]
+        others = [f for f in files if "stores" not in f]
+
+        start = time.perf_counter()
+        # No máximo `workers` arquivos em voo (e nunca mais que pool_max conexões)
+        slots = asyncio.Semaphore(max(self.workers, 1))
+        results = await self._run_concurrent(stores_files, slots)
+        results += await self._run_concurrent(others, slots)
+        self._print_summary(results, time.perf_counter() - start)
+        return results
+
+    async def _run_concurrent(self, files, slots):
+        async def run(file):
+            async with slots:
+                return await self._process_file(file)
+        return list(await asyncio.gather(*(run(f) for f in files)))
+
+    async def _process_file(self, file):
+        print(f"Processing {file}...")
+        start = time.perf_counter()
+        rows = 0
+        try:
+            with metrics.stage('fingerprint'):
+                fingerprint = await asyncio.to_thread(
+                    file_fingerprint, os.path.join(self.inbox_path, file)
+                )
+            rows = await self._load_file(file, fingerprint)
+            status = "ok" if rows is not None else "skipped"
+            rows = rows or 0
+
+            await asyncio.to_thread(self._finish_file, file)
+        except Exception as e:
+            print(f"Error processing {file}: {e}")
+            status = "FAILED"
+        return self._file_result(file, rows, time.perf_counter() - start, status)
+
+    async def _load_file(self, file, fingerprint):
+        # Mesmo retry de deadlock do IngestionEngine._load_file
+        for attempt in range(1, self.deadlock_retries + 2):
+            try:
+                if "stores" in file:
+                    return await self._process_stores(file, fingerprint)
+                if "sales" in file:
+                    return await self._process_sales(file, fingerprint)
+                return 0
+            except Exception as e:
+                if not is_deadlock(e) or attempt > self.deadlock_retries:
+                    raise
+                metrics.incr('deadlock_retries')
+                print(f"Deadlock loading {file}, retrying ({attempt}/{self.deadlock_retries})...")
+
+    async def _already_loaded(self, cur, filename, fingerprint):
+        # Mesma checagem (com lock no hash) de IngestionEngine._already_loaded
+        if fingerprint is None:
+            return False
+        file_hash, file_size = fingerprint
+        await cur.execute(FINGERPRINT_LOCK_SQL, (file_hash,))
+        if self.force_reload:
+            return False
+        await cur.execute(FINGERPRINT_LOOKUP_SQL, (file_hash, file_size))
+        row = await cur.fetchone()
+        if row:
+            print(f"Skipping {filename}: same content already loaded as {row[0]}.")
+        return bool(row)
+
+    async def _get_store_cache(self):
+        async with self._store_cache_alock:
+            if self._store_cache is None:
+                async with self.async_pool.connection() as conn:
+                    cur = await conn.execute(stores.TOKENS_SQL)
+                    self._store_cache = StoreCache(row[0] for row in await cur.fetchall())
+                print(f"Loaded {len(self._store_cache)} store tokens into cache.")
+            return self._store_cache
+
+    async def _prefetched(self, chunks, to_copy):
+        """
+        Itera `chunks` (gerador síncrono) numa thread, sempre um chunk à
+        frente do consumidor. `to_copy` monta o CSV do COPY na mesma thread.
+        """
+        def produce():
+            item = next(chunks, None)
+            return None if item is None else (item, to_copy(item))
+
+        pending = asyncio.ensure_future(asyncio.to_thread(produce))
+        try:
+            while (produced := await pending) is not None:
+                pending = asyncio.ensure_future(asyncio.to_thread(produce))
+                yield produced
+        finally:
+            # Erro no load: espera a thread largar o gerador antes de fechá-lo
+            if not pending.done():
+                await asyncio.gather(pending, return_exceptions=True)
+            chunks.close()
+
+    async def _process_stores(self, filename, fingerprint=None):
+        counts = {'total': 0, 'valid': 0, 'inserted': 0, 'updated': 0}
+        tokens = set()
+        chunks = self._prepare_stores_chunks(filename, tokens, counts)
+
+        async with self.async_pool.connection() as conn:
+            cur = conn.cursor()
+            if await self._already_loaded(cur, filename, fingerprint):
+                chunks.close()
+                return None
+            await cur.execute(STORES_STAGING_SQL)
+
+            async with aclosing(self._prefetched(chunks, stores_copy_data)) as items:
+                async for _, data in items:
+                    with metrics.stage('load', file_type='stores'):
+                        async with cur.copy(STORES_COPY_SQL) as copy:
+                            await copy.write(data)
+                        await cur.execute(STORES_MERGE_SQL)
+                        inserted, updated = await cur.fetchone()
+                        counts['inserted'] += inserted
+                        counts['updated'] += updated
+                        await cur.execute("TRUNCATE stg_stores;")
+
+            await cur.execute(BATCH_LOG_SQL, batch_log_params(
+                filename, self._batch_date(filename), 'stores',
+                counts['total'], counts['valid'], fingerprint
+            ))
+            with metrics.stage('commit', file_type='stores'):
+                await conn.commit()
+
+        self._stores_committed(filename, tokens, counts)
+        return counts['valid']
+
+    async def _process_sales(self, filename, fingerprint=None):
+        batch_date = self._batch_date(filename)
+        counts = {'total': 0, 'valid': 0, 'rejected': 0, 'quarantined': 0, 'duplicates': 0}
+        touched_dates = set()
+        placeholders = set()
+        store_cache = await self._get_store_cache()
+        archive = self._archive_writer(filename)
+        chunks = self._prepare_sales_chunks(
+            filename, batch_date, store_cache, placeholders, archive, counts
+        )
+
+        try:
+            async with self.async_pool.connection() as conn:
+                cur = conn.cursor()
+                if await self._already_loaded(cur, filename, fingerprint):
+                    chunks.close()
+                    return None
+                await cur.execute(SALES_STAGING_SQL)
+
+                items = self._prefetched(chunks, lambda item: sales_copy_data(item[0]))
+                async with aclosing(items):
+                    async for (sales, new_placeholders), data in items:
+                        with metrics.stage('load', file_type='sales'):
+                            if new_placeholders:
+                                await cur.execute(PLACEHOLDER_STORES_SQL, (new_placeholders,))
+                            chunk_dates = sales['transaction_time'].dt.date.unique()
+                            touched_dates.update(chunk_dates)
+                            # Transação curta à parte (psycopg2, numa thread); raro: mês novo
+                            await asyncio.to_thread(self._ensure_partitions, chunk_dates)
+
+                            async with cur.copy(SALES_COPY_SQL) as copy:
+                                await copy.write(data)
+                            await cur.execute(SALES_LOCK_SQL)
+                            await cur.execute(SALES_MOVED_SQL)
+                            touched_dates.update(r[0] for r in await cur.fetchall())
+                            await cur.execute(SALES_MERGE_SQL)
+                            await cur.execute("TRUNCATE stg_sales;")
+
+                with metrics.stage('aggregate', file_type='sales'):
+                    for sql, params in aggregates.refresh_statements(touched_dates):
+                        await cur.execute(sql, params)
+
+                await cur.execute(BATCH_LOG_SQL, batch_log_params(
+                    filename, batch_date, 'sales', counts['total'], counts['valid'], fingerprint,
+                    counts['duplicates']
+                ))
+                with metrics.stage('commit', file_type='sales'):
+                    await conn.commit()
+        except Exception:
+            if archive:
+                archive.abort()
+            raise
+
+        self._sales_committed(archive, store_cache, placeholders, counts)
+        return counts['valid']
+
+
+class AsyncReportGenerator(ReportGenerator):
+    """Mesmos relatórios do ReportGenerator, todos concorrentes no pool assíncrono."""
+
+    def __init__(self, pool, db=None, date_from=None, date_to=None):
+        super().__init__(db=db, date_from=date_from, date_to=date_to)
+        self.async_pool = pool
+
+    async def generate_all(self, force=False):
+        return await self.generate(REPORTS, force=force)
+
+    async def generate(self, names, force=False):
+        watermark = await self._watermark() if self.cache_enabled else None
+        reports = self._stale(self.queries(names), watermark, force)
+        if not reports:
+            print("Reports up to date (no new data since last run).")
+            return True
+        print(f"Generating reports: {', '.join(f for _, f in reports)}...")
+        done = await asyncio.gather(*(self._save_csv(query, filename) for query, filename in reports))
+        self._remember(reports, done, watermark)
+        return all(done)
+
+    async def _watermark(self):
+        async with self.async_pool.connection() as conn:
+            cur = await conn.execute(WATERMARK_SQL)
+            return str(await cur.fetchone())
+
+    async def _save_csv(self, query, filename):
+        path = f"{self.output_path}{filename}"
+        tmp_path = f"{path}.tmp"
+        copy_sql = f"COPY ({query.strip().rstrip(';')}) TO STDOUT WITH CSV HEADER"
+        start = time.perf_counter()
+        try:
+            with metrics.stage('report', report=filename):
+                async with self.async_pool.connection() as conn:
+                    async with conn.cursor().copy(copy_sql) as copy:
+                        with open(tmp_path, "wb") as f:
+                            async for data in copy:
+                                f.write(data)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            metrics.incr('report_bytes', size, report=filename)
+            print(f"Generated {filename} ({size} bytes in {time.perf_counter() - start:.2f}s)")
+            return True
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Error generating {filename}: {e}")
+            return False
+
+
+async def _run_pipeline(db, ingest, reports, report_options, force, force_reload):
+    ok = True
+    async with open_pool(db) as pool:
+        if ingest:
+            try:
+                engine = AsyncIngestionEngine(pool, db=db, force_reload=force_reload or None)
+                results = await engine.process_inbox()
+            except Exception as e:
+                print(f"Ingestion failed: {e}")
+                return False
+            ok = all(r['status'] != 'FAILED' for r in results)
+        if reports:
+            try:
+                generator = AsyncReportGenerator(pool, db=db, **report_options)
+                ok = await generator.generate(reports, force=force) and ok
+            except Exception as e:
+                print(f"Reporting failed: {e}")
+                return False
+    return ok
+
+
+def run_pipeline(db, ingest=True, reports=REPORTS, force=False, force_reload=False, **report_options):
+    """
+    Ingestão e/ou relatórios com ingestion.engine = 'async'. `report_options`
+    vai para o AsyncReportGenerator (date_from/date_to); `force_reload` como
+    em run_ingest. Retorna False se alguma etapa falhou.
+    """
+    return asyncio.run(_run_pipeline(db, ingest, list(reports), report_options, force, force_reload))
@@ -1,7 +1,12 @@
-import psycopg2
+import threading
+from contextlib import contextmanager
+
 import yaml
 import os
 
+# psycopg2 é importado sob demanda: comandos sem banco (ex.: ingest --dry-run)
+# e o --help do main.py não pagam o import
+
 class Database:
     def __init__(self, config_path="config/config.yaml"):
         # Ajuste de path para rodar da raiz
@@ -9,14 +14,95 @@ class Database:
             raise FileNotFoundError(f"Config file not found at {config_path}")
             
         with open(config_path, "r") as f:
-            self.cfg = yaml.safe_load(f)['database']
-        
-    def get_connection(self):
-        conn = psycopg2.connect(
+            self.config = yaml.safe_load(f)
+        self.cfg = self.config['database']
+
+        self.pool_min = int(self.cfg.get('pool_min', 1))
+        self.pool_max = int(self.cfg.get('pool_max', 8))
+        self.health_check = bool(self.cfg.get('pool_health_check', True))
+        # Pool criado sob demanda (e recriado em cada processo filho)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_max)
+
+    def __getstate__(self):
+        # Pool/locks não atravessam processos: cada worker abre o seu
+        state = self.__dict__.copy()
+        for key in ('_pool', '_pool_lock', '_slots'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_max)
+
+    def _connect_kwargs(self):
+        return dict(
             host=self.cfg['host'],
             port=self.cfg['port'],
             database=self.cfg['dbname'],
             user=self.cfg['user'],
             password=self.cfg['password']
         )
-        return conn
\ No newline at end of file
+        
+    def get_connection(self):
+        import psycopg2
+        conn = psycopg2.connect(**self._connect_kwargs())
+        return conn
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from psycopg2 import pool
+                self._pool = pool.ThreadedConnectionPool(
+                    self.pool_min, self.pool_max, **self._connect_kwargs()
+                )
+            return self._pool
+
+    def _is_healthy(self, conn):
+        import psycopg2
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão do pool compartilhado. Bloqueia quando todas
+        as `pool_max` conexões estão em uso. Transações não commitadas são
+        desfeitas na devolução.
+        """
+        db_pool = self._get_pool()
+        self._slots.acquire()
+        try:
+            conn = db_pool.getconn()
+            if not self._is_healthy(conn):
+                # Conexão morta (restart do banco, timeout de rede): descarta e abre outra
+                db_pool.putconn(conn, close=True)
+                conn = db_pool.getconn()
+            try:
+                yield conn
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                db_pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
@@ -0,0 +1,144 @@
+# Deduplicação de vendas dentro de um arquivo, antes do load.
+import numpy as np
+
+from src.validation import as_text
+
+# latest: vence o maior transaction_time (empate: a última linha)
+# last: vence a última linha do arquivo
+# reject: todas as ocorrências da chave vão para o rejected
+DUPLICATE_RULES = ('latest', 'last', 'reject')
+
+KEY_COLUMNS = ['store_token', 'transaction_id']
+
+# Dígito hexadecimal (ASCII) -> valor do nibble
+_NIBBLES = np.zeros(256, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _NIBBLES[_c] = _NIBBLES[ord(chr(_c).upper())] = _i
+
+
+def key_bytes(sales):
+    """
+    Chave exata de cada linha: os 16 bytes de store_token seguidos dos 16 de
+    transaction_id (as linhas já passaram pela validação de UUID). Igual
+    para maiúsculas/minúsculas, como o UUID no Postgres; array 'S32'.
+    """
+    digits = (as_text(sales['store_token']) + as_text(sales['transaction_id'])).str.replace('-', '', regex=False)
+    text = np.array(digits.tolist(), dtype='S64').view(np.uint8).reshape(-1, 64)
+    nibbles = _NIBBLES[text]
+    packed = (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+    return np.ascontiguousarray(packed).view('S32').ravel()
+
+
+def repeated_keys(key_arrays):
+    """Chaves (array 'S32' ordenado) que aparecem mais de uma vez nos arrays dados."""
+    keys = list(key_arrays) or [np.empty(0, dtype='S32')]
+    keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+    return keys[counts > 1]
+
+
+class SeenKeys:
+    """
+    Chaves já carregadas por chunks anteriores do arquivo, num array 'S32'
+    ordenado: 32 bytes por chave distinta. Com `times` (regra 'latest'),
+    também o maior transaction_time de cada uma (mais 8 bytes).
+    """
+
+    def __init__(self, times=False):
+        self.keys = np.empty(0, dtype='S32')
+        # Microssegundos, como o parse (TIME_PATTERN): em ns, anos antes de 1677 dariam a volta
+        self.times = np.empty(0, dtype='datetime64[us]') if times else None
+
+    def lookup(self, keys):
+        # Posição de cada chave no array ordenado e se ela já está lá
+        return np.searchsorted(self.keys, keys), contains_keys(self.keys, keys)
+
+    def add(self, keys, times=None):
+        keys, first = np.unique(keys, return_index=True)
+        pos, seen = self.lookup(keys)
+        if self.times is not None:
+            times = times[first]
+            self.times[pos[seen]] = np.maximum(self.times[pos[seen]], times[seen])
+            self.times = np.insert(self.times, pos[~seen], times[~seen])
+        self.keys = np.insert(self.keys, pos[~seen], keys[~seen])
+
+
+class SalesDeduplicator:
+    """
+    Uma instância por arquivo. Cada chunk sai com chaves distintas (o merge
+    set-based não aceita a mesma chave duas vezes) e as chaves já vistas em
+    chunks anteriores ficam em SeenKeys, para aplicar a regra também entre
+    chunks.
+
+    A regra 'reject' precisa do arquivo inteiro: prescan() conta as chaves
+    numa primeira passada e apply() recusa todas as ocorrências das que se
+    repetem, independente de em qual chunk cada uma cai.
+
+    `superseded` acumula as linhas mantidas que substituem uma chave já
+    carregada por um chunk anterior: a cópia anterior já contou como
+    válida, então o total de válidas do arquivo desconta essas.
+    """
+
+    def __init__(self, rule='last'):
+        if rule not in DUPLICATE_RULES:
+            raise ValueError(f"duplicate_rule must be one of {DUPLICATE_RULES}, got {rule!r}")
+        self.rule = rule
+        self._seen = SeenKeys(times=rule == 'latest')
+        self._repeated = None
+        self.superseded = 0
+
+    @property
+    def needs_prescan(self):
+        return self.rule == 'reject'
+
+    def prescan(self, valid_chunks):
+        # Primeira passada ('reject'): chaves que aparecem mais de uma vez no arquivo
+        self._repeated = repeated_keys(key_bytes(valid) for valid in valid_chunks if not valid.empty)
+
+    def apply(self, valid):
+        """
+        Retorna (kept, rejected, duplicates): linhas a carregar, linhas
+        recusadas pela regra 'reject' e total de linhas descartadas ou
+        recusadas por repetição.
+        """
+        if valid.empty:
+            return valid, valid.iloc[0:0], 0
+
+        keys = key_bytes(valid)
+
+        if self.rule == 'reject':
+            if self._repeated is None:
+                raise RuntimeError("duplicate_rule 'reject' needs prescan() over the whole file first")
+            drop = contains_keys(self._repeated, keys)
+            return valid.loc[~drop], valid.loc[drop], int(drop.sum())
+
+        latest = self.rule == 'latest'
+        times = valid['transaction_time'].to_numpy(dtype='datetime64[us]') if latest else None
+        pos, seen = self._seen.lookup(keys)
+
+        # Última ocorrência de cada chave no chunk; em 'latest', pela ordem de transaction_time
+        order = np.arange(len(keys))
+        if latest:
+            order = order[np.argsort(times, kind='stable')]
+        _, last = np.unique(keys[order][::-1], return_index=True)
+        keep = np.zeros(len(keys), dtype=bool)
+        keep[order[len(order) - 1 - last]] = True
+
+        if latest:
+            # Versão mais nova já carregada por um chunk anterior vence
+            older = seen & keep
+            older[older] = times[older] < self._seen.times[pos[older]]
+            keep &= ~older
+
+        self._seen.add(keys[keep], times[keep] if latest else None)
+        superseded = int((seen & keep).sum())
+        self.superseded += superseded
+        # Descartadas aqui + as que substituem uma ocorrência já carregada
+        return valid.loc[keep], valid.iloc[0:0], int((~keep).sum()) + superseded
+
+def contains_keys(sorted_keys, keys):
+    # Máscara: quais de `keys` estão no array ordenado `sorted_keys`
+    pos = np.searchsorted(sorted_keys, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    inside = pos < len(sorted_keys)
+    found[inside] = sorted_keys[pos[inside]] == keys[inside]
+    return found
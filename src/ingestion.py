@@ -1,109 +1,964 @@
+import csv
+import hashlib
+import io
 import os
+import re
 import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 from datetime import datetime
+from src import aggregates, partitions
+from src.archive import SalesArchiveWriter, archived_files, read_archive_chunks
 from src.database import Database
+from src.dedup import DUPLICATE_RULES, SalesDeduplicator
+from src.metrics import metrics
+from src.profiling import Profiler
+from src.readers import INBOX_SUFFIXES, file_stem, read_chunks
+from src.schema import SALES_SCHEMA, STORES_SCHEMA, check_columns
+from src.streaming import (
+    STREAM_SUFFIXES, RowDeduplicator, RowsWriter, open_text, parse_amount, parse_time, reject_reason,
+)
+from src.stores import StoreCache
+from src.validation import validate_sales, validate_stores
+
+STORES_COLUMNS = ['store_group', 'store_token', 'store_name']
+
+SALES_COLUMNS = [
+    'store_token', 'transaction_id', 'receipt_token',
+    'transaction_time', 'amount', 'user_role', 'batch_date'
+]
+
+SALES_COLS = ', '.join(SALES_COLUMNS)
+STORES_COLS = ', '.join(STORES_COLUMNS)
+
+UNKNOWN_STORE_POLICIES = ('placeholder', 'reject', 'quarantine')
+
+# SQL compartilhado pelo engine síncrono e pelo assíncrono (src/async_engine.py)
+
+# Staging temporária: sem WAL e privada da sessão (seguro p/ loads paralelos)
+SALES_STAGING_SQL = """
+    CREATE TEMP TABLE stg_sales
+    (LIKE analytics.fact_sales INCLUDING DEFAULTS)
+    ON COMMIT DROP;
+"""
+SALES_COPY_SQL = f"COPY stg_sales ({SALES_COLS}) FROM STDIN WITH (FORMAT csv)"
+
+# fact_sales é particionada por transaction_time, que entra na PK:
+# versões antigas de transações cujo horário mudou saem antes do insert.
+# Os dias delas voltam para o refresh dos agregados.
+SALES_MOVED_SQL = """
+    DELETE FROM analytics.fact_sales f
+    USING stg_sales s
+    WHERE f.store_token = s.store_token
+      AND f.transaction_id = s.transaction_id
+      AND f.transaction_time <> s.transaction_time
+    RETURNING DATE(f.transaction_time);
+"""
+SALES_MERGE_SQL = f"""
+    INSERT INTO analytics.fact_sales ({SALES_COLS})
+    SELECT {SALES_COLS} FROM stg_sales
+    ON CONFLICT (store_token, transaction_id, transaction_time)
+    DO UPDATE SET amount = EXCLUDED.amount;
+"""
+
+# Unicidade de (store_token, transaction_id) entre workers em paralelo. Como a PK
+# inclui transaction_time, dois arquivos com a mesma transação em horários
+# diferentes não colidem no índice, e o DELETE acima não enxerga a linha ainda
+# não commitada do outro: as duas versões ficariam. Por isso, antes do
+# delete+insert, cada chunk trava até o commit as faixas de store_token que
+# contém, em ordem crescente. Quem chega depois espera o commit de quem travou
+# antes, e o DELETE seguinte (READ COMMITTED, snapshot novo por comando) já vê a
+# versão commitada e a remove. Ordens cruzadas entre chunks de arquivos
+# diferentes viram deadlock (40P01): o banco aborta um dos arquivos, que é
+# refeito (ingestion.deadlock_retries). No máximo SALES_LOCK_BUCKETS locks por
+# transação, bem abaixo da tabela de locks padrão do Postgres.
+SALES_LOCK_BUCKETS = 256
+
+
+def sales_lock_sql(source):
+    return f"""
+    SELECT pg_advisory_xact_lock(hashtext('analytics.fact_sales.keys'), bucket)
+    FROM (
+        SELECT DISTINCT hashtext(store_token::text) & {SALES_LOCK_BUCKETS - 1} AS bucket
+        FROM {source}
+        ORDER BY bucket
+    ) buckets;
+"""
+
+
+SALES_LOCK_SQL = sales_lock_sql("stg_sales")
+
+# Replay: fact_sales guarda só a versão atual de cada transação, então uma
+# chave que existe fora do intervalo foi movida para lá por um arquivo
+# posterior e a versão arquivada dentro do intervalo está velha: sai da
+# staging antes do merge. As demais substituem as versões da mesma chave
+# dentro do intervalo (REPLAY_REPLACE_SQL); chaves fora do archive ficam.
+REPLAY_STALE_SQL = """
+    DELETE FROM stg_sales s
+    USING analytics.fact_sales f
+    WHERE f.store_token = s.store_token
+      AND f.transaction_id = s.transaction_id
+      AND (f.transaction_time < %(date_from)s OR f.transaction_time >= %(date_to)s::date + 1);
+"""
+# Versões anteriores reinseridas pelo próprio replay: só dentro do intervalo
+REPLAY_REPLACE_SQL = """
+    DELETE FROM analytics.fact_sales f
+    USING stg_sales s
+    WHERE f.store_token = s.store_token
+      AND f.transaction_id = s.transaction_id
+      AND f.transaction_time >= %(date_from)s AND f.transaction_time < %(date_to)s::date + 1;
+"""
+
+STORES_STAGING_SQL = """
+    CREATE TEMP TABLE stg_stores
+    (LIKE analytics.dim_stores INCLUDING DEFAULTS)
+    ON COMMIT DROP;
+"""
+STORES_COPY_SQL = f"COPY stg_stores ({STORES_COLS}) FROM STDIN WITH (FORMAT csv)"
+
+# Só reescreve a linha (e updated_at) quando nome ou grupo mudaram de fato:
+# a lista completa chega todo dia e quase tudo é igual
+STORES_MERGE_SQL = f"""
+    WITH upserted AS (
+        INSERT INTO analytics.dim_stores ({STORES_COLS})
+        SELECT {STORES_COLS} FROM stg_stores
+        ON CONFLICT (store_token) DO UPDATE
+        SET store_name = EXCLUDED.store_name,
+            store_group = EXCLUDED.store_group,
+            updated_at = NOW()
+        WHERE (dim_stores.store_name, dim_stores.store_group)
+              IS DISTINCT FROM (EXCLUDED.store_name, EXCLUDED.store_group)
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE inserted),
+        COUNT(*) FILTER (WHERE NOT inserted)
+    FROM upserted;
+"""
+
+# Loja com nome provisório; o próximo stores_*.csv corrige o nome
+PLACEHOLDER_STORES_SQL = """
+    INSERT INTO analytics.dim_stores (store_token, store_name)
+    SELECT token, 'Unknown store' FROM unnest(%s::uuid[]) AS t(token)
+    ON CONFLICT (store_token) DO NOTHING;
+"""
+
+# Dois workers com arquivos idênticos (mesmo hash): o segundo espera o commit
+# do primeiro antes de consultar o sys_batch_log, e então o encontra lá
+FINGERPRINT_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s));"
+FINGERPRINT_LOOKUP_SQL = """
+    SELECT file_name FROM analytics.sys_batch_log
+    WHERE file_hash = %s AND file_size = %s
+    LIMIT 1;
+"""
+
+# Reentrega com o mesmo nome (conteúdo novo ou force_reload) sobrescreve o log
+BATCH_LOG_SQL = """
+    INSERT INTO analytics.sys_batch_log 
+    (file_name, batch_date, file_type, total_rows, valid_rows, invalid_rows,
+     duplicate_rows, file_hash, file_size)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (file_name) DO UPDATE SET
+        batch_date = EXCLUDED.batch_date,
+        processed_at = CURRENT_TIMESTAMP,
+        total_rows = EXCLUDED.total_rows,
+        valid_rows = EXCLUDED.valid_rows,
+        invalid_rows = EXCLUDED.invalid_rows,
+        duplicate_rows = EXCLUDED.duplicate_rows,
+        file_hash = EXCLUDED.file_hash,
+        file_size = EXCLUDED.file_size;
+"""
+
+
+def batch_log_params(filename, batch_date, file_type, total_rows, valid_rows, fingerprint,
+                     duplicate_rows=0):
+    file_hash, file_size = fingerprint or (None, None)
+    return (filename, batch_date, file_type, total_rows, valid_rows,
+            total_rows - valid_rows, duplicate_rows, file_hash, file_size)
+
+
+def sales_copy_data(sales):
+    # Chunks do inbox já chegam sem chave repetida (src/dedup.py); a guarda fica
+    # para o replay de archives gravados antes da deduplicação
+    sales = sales.drop_duplicates(subset=['store_token', 'transaction_id'], keep='last')
+    return sales.to_csv(index=False, header=False)
+
+
+def stores_copy_data(stores):
+    # Token repetido no arquivo: a última linha vence (evita o erro de multi-hit do ON CONFLICT)
+    stores = stores.drop_duplicates(subset=['store_token'], keep='last')
+    return stores.to_csv(index=False, header=False)
+
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+def is_deadlock(exc):
+    # psycopg2 (pgcode) e psycopg 3 (sqlstate)
+    return (getattr(exc, 'pgcode', None) or getattr(exc, 'sqlstate', None)) == '40P01'
+
+
+def file_fingerprint(path):
+    # sha256 lido em blocos (memória constante) + tamanho em bytes
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(FINGERPRINT_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest(), os.path.getsize(path)
 
 class IngestionEngine:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, load_mode=None, db=None, force_reload=None):
+        # Pool compartilhado com o ReportGenerator quando `db` é passado
+        self.db = db or Database()
+        self.cfg = self.db.config.get('ingestion') or {}
+        # 'copy' (bulk, padrão) ou 'rows' (um INSERT por linha)
+        self.load_mode = load_mode or self.cfg.get('load_mode', 'copy')
+        # Linhas por chunk: memória constante independente do tamanho do arquivo
+        self.chunk_size = int(self.cfg.get('chunk_size', 100000))
+        # Parser das vendas em CSV: 'pandas' (DataFrames por chunk) ou 'csv'
+        # (módulo csv linha a linha direto para o COPY, sem DataFrame; só modo copy)
+        self.parser = self.cfg.get('parser', 'pandas')
+        if self.parser not in ('pandas', 'csv'):
+            raise ValueError("ingestion.parser must be 'pandas' or 'csv'")
+        # Arquivos processados em paralelo (1 = sequencial); pool 'thread' ou 'process'
+        self.workers = int(self.cfg.get('workers', 1))
+        self.pool = self.cfg.get('pool', 'thread')
+        # Arquivo cuja transação o banco abortou por deadlock (40P01) é refeito
+        self.deadlock_retries = int(self.cfg.get('deadlock_retries', 3))
+        # Recarrega mesmo arquivos cujo conteúdo já consta no sys_batch_log
+        self.force_reload = bool(
+            self.cfg.get('force_reload', False) if force_reload is None else force_reload
+        )
         self.inbox_path = "data/inbox/"
         self.history_path = "data/history/"
-        
-        # Garante que as pastas existem
+        self.rejected_path = "data/rejected/"
+        # Archive Parquet das vendas limpas (src/archive.py)
+        self.archive_cfg = self.db.config.get('archive') or {}
+        self.archive_enabled = bool(self.archive_cfg.get('enabled', False))
+        self.archive_path = self.archive_cfg.get('path', "data/archive/sales/")
+        # Com o archive ligado, o CSV bruto só vai para data/history/ se keep_raw
+        self.keep_raw = bool(self.archive_cfg.get('keep_raw', True))
+        # Meses cuja partição de fact_sales já existe (verificada/criada nesta execução)
+        self._known_partitions = set()
+        # Vendas de lojas fora de dim_stores: 'placeholder' (carrega), 'reject' ou 'quarantine'
+        self.unknown_store_policy = self.cfg.get('unknown_store_policy', 'placeholder')
+        if self.unknown_store_policy not in UNKNOWN_STORE_POLICIES:
+            raise ValueError(f"ingestion.unknown_store_policy must be one of {UNKNOWN_STORE_POLICIES}")
+        # Mesma (store_token, transaction_id) repetida no arquivo: 'latest', 'last' ou 'reject'
+        self.duplicate_rule = self.cfg.get('duplicate_rule', 'last')
+        if self.duplicate_rule not in DUPLICATE_RULES:
+            raise ValueError(f"ingestion.duplicate_rule must be one of {DUPLICATE_RULES}")
+        self.quarantine_path = "data/quarantine/"
+        # Tokens de dim_stores, carregados sob demanda (uma vez por execução)
+        self._store_cache = None
+        self._store_cache_lock = threading.Lock()
+        # Profiling opt-in por arquivo (src/profiling.py)
+        self.profiler = Profiler(self.db.config.get('profiling'))
+
+    def _make_dirs(self):
+        # Só quando há arquivos a processar de fato: o dry_run não cria nada
         os.makedirs(self.history_path, exist_ok=True)
+        os.makedirs(self.rejected_path, exist_ok=True)
+        os.makedirs(self.quarantine_path, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_store_cache_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._store_cache_lock = threading.Lock()
+
+    def list_inbox(self):
+        return sorted(f for f in os.listdir(self.inbox_path) if f.endswith(INBOX_SUFFIXES))
 
     def process_inbox(self):
-        files = [f for f in os.listdir(self.inbox_path) if f.endswith('.csv')]
+        files = self.list_inbox()
         
         if not files:
             print("No files found in inbox.")
-            return
+            return []
+
+        return self.process_files(files)
+
+    def process_files(self, files):
+        self._make_dirs()
+        # Lojas antes das vendas: a dimensão precisa estar carregada primeiro
+        stores = [f for f in files if "stores" in f]
+        others = [f for f in files if "stores" not in f]
 
+        start = time.perf_counter()
+        results = self._run_parallel(stores)
+        if stores and self.workers > 1 and self.pool == 'process':
+            # Workers em outro processo não atualizam o cache deste: recarrega
+            self._store_cache = None
+        results += self._run_parallel(others)
+        self._print_summary(results, time.perf_counter() - start)
+        return results
+
+    def dry_run(self, files=None):
+        """
+        Só lê e valida os arquivos (schema, tipos, duplicatas), sem banco e
+        sem escrever ou mover nada. A checagem contra dim_stores não roda:
+        vendas de lojas desconhecidas contam como válidas.
+        """
+        files = self.list_inbox() if files is None else files
+        start = time.perf_counter()
+        results = []
         for file in files:
-            print(f"Processing {file}...")
+            file_start = time.perf_counter()
+            counts = {'total': 0, 'valid': 0, 'duplicates': 0}
+            reasons = {}
+            try:
+                self._dry_run_file(file, counts, reasons)
+                status = "ok"
+            except Exception as e:
+                print(f"Error reading {file}: {e}")
+                status = "FAILED"
+            detail = ', '.join(f"{reason}={n}" for reason, n in sorted(reasons.items())) or 'none'
+            print(f"{file}: {counts['total']} rows, {counts['valid']} valid, "
+                  f"{counts['duplicates']} duplicates; rejected: {detail}")
+            results.append({'file': file, 'rows': counts['valid'],
+                            'seconds': time.perf_counter() - file_start, 'status': status})
+        self._print_summary(results, time.perf_counter() - start)
+        return results
+
+    def _dry_run_file(self, file, counts, reasons):
+        if "stores" in file:
+            schema, validate, dedup = STORES_SCHEMA, validate_stores, None
+        elif "sales" in file:
+            schema, validate, dedup = SALES_SCHEMA, validate_sales, self._sales_deduplicator(file)
+        else:
+            return
+        for chunk in self._read_chunks(file, schema):
+            valid, rejected = validate(chunk)
+            if dedup:
+                valid, duplicated, duplicates = dedup.apply(valid)
+                counts['duplicates'] += duplicates
+                if len(duplicated):
+                    reasons['duplicate_transaction'] = reasons.get('duplicate_transaction', 0) + len(duplicated)
+            for reason, n in rejected['reject_reason'].value_counts().items():
+                reasons[reason] = reasons.get(reason, 0) + int(n)
+            counts['total'] += len(chunk)
+            counts['valid'] += len(valid)
+        if dedup:
+            counts['valid'] -= dedup.superseded
+
+    def _run_parallel(self, files):
+        if self.workers <= 1 or len(files) <= 1:
+            return [self._process_file(f) for f in files]
+
+        executor_cls = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+        with executor_cls(max_workers=min(self.workers, len(files))) as executor:
+            return list(executor.map(self._process_file, files))
+
+    def _process_file(self, file):
+        # Cada arquivo roda na sua própria conexão/transação
+        print(f"Processing {file}...")
+        start = time.perf_counter()
+        rows = 0
+        try:
+            with self.profiler.profile('ingest', file):
+                with metrics.stage('fingerprint'):
+                    fingerprint = file_fingerprint(os.path.join(self.inbox_path, file))
+                # None: mesmo conteúdo já carregado (ver _already_loaded)
+                rows = self._load_file(file, fingerprint)
+                status = "ok" if rows is not None else "skipped"
+                rows = rows or 0
+            
+                # Move to history (só depois do commit)
+                self._finish_file(file)
+        except Exception as e:
+            print(f"Error processing {file}: {e}")
+            status = "FAILED"
+        return self._file_result(file, rows, time.perf_counter() - start, status)
+
+    def _load_file(self, file, fingerprint):
+        # Nada fica pela metade no deadlock: rollback, archive abortado e
+        # rejected/quarentena reescritos do zero na nova tentativa
+        for attempt in range(1, self.deadlock_retries + 2):
             try:
                 if "stores" in file:
-                    self._process_stores(file)
-                elif "sales" in file:
-                    self._process_sales(file)
-                
-                # Move to history
+                    return self._process_stores(file, fingerprint)
+                if "sales" in file:
+                    return self._process_sales(file, fingerprint)
+                return 0
+            except Exception as e:
+                if not is_deadlock(e) or attempt > self.deadlock_retries:
+                    raise
+                metrics.incr('deadlock_retries')
+                print(f"Deadlock loading {file}, retrying ({attempt}/{self.deadlock_retries})...")
+
+    def _finish_file(self, file):
+        with metrics.stage('move_to_history'):
+            if self._archives(file) and not self.keep_raw:
+                os.remove(os.path.join(self.inbox_path, file))
+                print(f"Removed {file} (archived as Parquet).")
+            else:
                 shutil.move(
                     os.path.join(self.inbox_path, file),
                     os.path.join(self.history_path, file)
                 )
                 print(f"Moved {file} to history.")
-            except Exception as e:
-                print(f"Error processing {file}: {e}")
 
-    def _process_stores(self, filename):
-        df = pd.read_csv(os.path.join(self.inbox_path, filename))
-        
+    def _file_result(self, file, rows, seconds, status):
+        metrics.incr('files', status=status)
+        metrics.event('file_processed', file=file, status=status, rows=rows,
+                      seconds=round(seconds, 3), rows_per_second=round(rows / seconds) if seconds else 0)
+        return {'file': file, 'rows': rows, 'seconds': seconds, 'status': status}
+
+    def _archives(self, filename):
+        return self.archive_enabled and "sales" in filename
+
+    def _already_loaded(self, cur, filename, fingerprint):
+        """
+        Checagem do fingerprint na transação do load: o lock no hash fica
+        até o commit, então arquivos idênticos em workers diferentes não
+        são carregados duas vezes. True (e nada a carregar) se o conteúdo
+        já consta no sys_batch_log.
+        """
+        if fingerprint is None:
+            return False
+        file_hash, file_size = fingerprint
+        cur.execute(FINGERPRINT_LOCK_SQL, (file_hash,))
+        if self.force_reload:
+            return False
+        cur.execute(FINGERPRINT_LOOKUP_SQL, (file_hash, file_size))
+        row = cur.fetchone()
+        if row:
+            print(f"Skipping {filename}: same content already loaded as {row[0]}.")
+        return bool(row)
+
+    def _get_store_cache(self):
+        with self._store_cache_lock:
+            if self._store_cache is None:
+                with self.db.connection() as conn:
+                    self._store_cache = StoreCache.load(conn.cursor())
+                print(f"Loaded {len(self._store_cache)} store tokens into cache.")
+            return self._store_cache
+
+    def _print_summary(self, results, elapsed):
+        print("--- Ingestion summary ---")
+        for r in results:
+            rate = r['rows'] / r['seconds'] if r['seconds'] else 0
+            print(f"{r['file']}: {r['status']}, {r['rows']} rows in {r['seconds']:.2f}s ({rate:,.0f} rows/s)")
+        total_rows = sum(r['rows'] for r in results)
+        rate = total_rows / elapsed if elapsed else 0
+        print(f"Total: {len(results)} files, {total_rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+    def _read_chunks(self, filename, schema):
+        return read_chunks(os.path.join(self.inbox_path, filename), schema, self.chunk_size)
+
+    def _batch_date(self, filename):
+        # Extract date from filename sales_20251128.csv (ou .csv.gz, .parquet...)
+        try:
+            batch_date_str = re.match(r"\d{8}", filename.split('_')[1]).group(0)
+            return datetime.strptime(batch_date_str, "%Y%m%d").date()
+        except:
+            return datetime.now().date()
+
+    def _log_batch(self, cur, filename, batch_date, file_type, total_rows, valid_rows, fingerprint,
+                   duplicate_rows=0):
+        cur.execute(BATCH_LOG_SQL, batch_log_params(
+            filename, batch_date, file_type, total_rows, valid_rows, fingerprint, duplicate_rows
+        ))
+
+    def _process_stores(self, filename, fingerprint=None):
+        counts = {'total': 0, 'valid': 0, 'inserted': 0, 'updated': 0}
+        tokens = set()
+
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            if self._already_loaded(cur, filename, fingerprint):
+                return None
+
+            if self.load_mode != 'rows':
+                self._create_stores_staging(cur)
+
+            for stores in self._prepare_stores_chunks(filename, tokens, counts):
+                with metrics.stage('load', file_type='stores'):
+                    if self.load_mode == 'rows':
+                        self._load_stores_rows(cur, stores)
+                    else:
+                        inserted, updated = self._load_stores_copy(cur, stores)
+                        counts['inserted'] += inserted
+                        counts['updated'] += updated
+
+            self._log_batch(cur, filename, self._batch_date(filename), 'stores',
+                            counts['total'], counts['valid'], fingerprint)
+            with metrics.stage('commit', file_type='stores'):
+                conn.commit()
+
+        self._stores_committed(filename, tokens, counts)
+        return counts['valid']
+
+    def _prepare_stores_chunks(self, filename, tokens, counts):
+        chunks = metrics.timed_iter(self._read_chunks(filename, STORES_SCHEMA), 'read', file_type='stores')
+        for chunk in chunks:
+            valid, rejected = validate_stores(chunk)
+            if len(rejected):
+                self._write_rejected(rejected, filename, append=counts['valid'] < counts['total'])
+            counts['total'] += len(chunk)
+            counts['valid'] += len(valid)
+            tokens.update(valid['store_token'])
+            yield valid[STORES_COLUMNS]
+
+    def _stores_committed(self, filename, tokens, counts):
+        if self._store_cache is not None:
+            self._store_cache.add(tokens)
+        metrics.incr('rows_read', counts['total'], file_type='stores')
+        if self.load_mode != 'rows':
+            # Tokens distintos que não geraram insert nem update
+            unchanged = max(len(tokens) - counts['inserted'] - counts['updated'], 0)
+            metrics.incr('stores_rows', counts['inserted'], outcome='inserted')
+            metrics.incr('stores_rows', counts['updated'], outcome='updated')
+            metrics.incr('stores_rows', unchanged, outcome='unchanged')
+            print(f"{filename}: {counts['inserted']} stores inserted, "
+                  f"{counts['updated']} updated, {unchanged} unchanged.")
+
+    def _load_stores_rows(self, cur, stores):
         upsert_sql = """
         INSERT INTO analytics.dim_stores (store_group, store_token, store_name)
         VALUES (%s, %s, %s)
         ON CONFLICT (store_token) 
         DO UPDATE SET store_name = EXCLUDED.store_name, updated_at = NOW();
         """
+        # pd.NA (store_group/store_name vazios em string[pyarrow]) não é adaptável pelo psycopg2
+        rows = stores.astype(object).where(stores.notna(), None)
+        for row in rows.itertuples(index=False, name=None):
+            cur.execute(upsert_sql, row)
+
+    def _create_stores_staging(self, cur):
+        cur.execute(STORES_STAGING_SQL)
+
+    def _load_stores_copy(self, cur, stores):
+        cur.copy_expert(STORES_COPY_SQL, io.StringIO(stores_copy_data(stores)))
+        cur.execute(STORES_MERGE_SQL)
+        inserted, updated = cur.fetchone()
+        cur.execute("TRUNCATE stg_stores;")
+        return inserted, updated
+
+    def _process_sales(self, filename, fingerprint=None):
+        batch_date = self._batch_date(filename)
+        counts = {'total': 0, 'valid': 0, 'rejected': 0, 'quarantined': 0, 'duplicates': 0}
+        # Dias (de transaction_time) cujos agregados precisam ser recalculados
+        touched_dates = set()
+        # Lojas placeholder criadas por este arquivo; entram no cache após o commit
+        placeholders = set()
+        store_cache = self._get_store_cache()
+        archive = self._archive_writer(filename)
         
-        conn = self.db.get_connection()
-        cur = conn.cursor()
-        
-        for _, row in df.iterrows():
-            try:
-                cur.execute(upsert_sql, (row['store_group'], row['store_token'], row['store_name']))
-            except Exception as e:
-                print(f"Skipping row in stores: {e}")
-        
-        conn.commit()
-        conn.close()
+        try:
+            with self.db.connection() as conn:
+                cur = conn.cursor()
+                if self._already_loaded(cur, filename, fingerprint):
+                    return None
+
+                if self.load_mode != 'rows':
+                    self._create_sales_staging(cur)
+
+                # Um chunk por vez; tudo na mesma transação, commit único no final
+                streaming = self._streams(filename)
+                prepare = self._prepare_sales_stream if streaming else self._prepare_sales_chunks
+                chunks = prepare(filename, batch_date, store_cache, placeholders, archive, counts)
+                for chunk, new_placeholders in chunks:
+                    with metrics.stage('load', file_type='sales'):
+                        if new_placeholders:
+                            cur.execute(PLACEHOLDER_STORES_SQL, (new_placeholders,))
+                        if streaming:
+                            data, chunk_dates = chunk
+                            self._load_sales_text(cur, data, chunk_dates, touched_dates)
+                        else:
+                            self._load_sales_chunk(cur, chunk, touched_dates)
+
+                self._refresh_aggregates(cur, touched_dates)
+
+                # Log Batch (mesma transação do load)
+                self._log_batch(cur, filename, batch_date, 'sales',
+                                counts['total'], counts['valid'], fingerprint, counts['duplicates'])
+
+                with metrics.stage('commit', file_type='sales'):
+                    conn.commit()
+        except Exception:
+            if archive:
+                archive.abort()
+            raise
+
+        self._sales_committed(archive, store_cache, placeholders, counts)
+        return counts['valid']
+
+    def _archive_writer(self, filename):
+        # Parquet do archive só é publicado depois do commit no banco
+        if not self._archives(filename):
+            return None
+        return SalesArchiveWriter(self.archive_path, file_stem(filename))
+
+    def _prepare_sales_chunks(self, filename, batch_date, store_cache, placeholders, archive, counts):
+        """
+        Lê, valida e checa as lojas de cada chunk (sem tocar no banco).
+        Escreve rejeitados/quarentena/archive e acumula `counts`.
+        Gera (sales, new_placeholders) prontos para o load.
+        """
+        dedup = self._sales_deduplicator(filename)
+        chunks = metrics.timed_iter(self._read_chunks(filename, SALES_SCHEMA), 'read', file_type='sales')
+        for chunk in chunks:
+            with metrics.stage('clean', file_type='sales'):
+                valid, rejected = validate_sales(chunk)
+                valid, rejected, quarantined, new_placeholders = self._check_stores(
+                    valid, rejected, store_cache, placeholders
+                )
+                # Depois da checagem de lojas: só o que seria carregado disputa a chave
+                valid, duplicated, duplicates = dedup.apply(valid)
+                counts['duplicates'] += duplicates
+                if len(duplicated):
+                    rejected = pd.concat([rejected, self._as_rejected(duplicated, 'duplicate_transaction')])
+                if len(rejected):
+                    self._write_rejected(rejected, filename, append=counts['rejected'] > 0)
+                    counts['rejected'] += len(rejected)
+                if len(quarantined):
+                    self._write_quarantine(quarantined, filename, append=counts['quarantined'] > 0)
+                    counts['quarantined'] += len(quarantined)
+            counts['total'] += len(chunk)
+            counts['valid'] += len(valid)
+
+            sales = valid.assign(batch_date=batch_date)[SALES_COLUMNS]
+            if archive:
+                with metrics.stage('archive', file_type='sales'):
+                    archive.write(sales)
+            yield sales, new_placeholders
+        # Válidas = chaves distintas carregadas, qualquer que seja o chunk_size
+        counts['valid'] -= dedup.superseded
+
+    def _sales_deduplicator(self, filename):
+        dedup = SalesDeduplicator(self.duplicate_rule)
+        if dedup.needs_prescan:
+            # 'reject': primeira passada pelo arquivo só para achar as chaves repetidas
+            with metrics.stage('dedup_prescan', file_type='sales'):
+                dedup.prescan(validate_sales(chunk)[0] for chunk in self._read_chunks(filename, SALES_SCHEMA))
+        return dedup
 
-    def _process_sales(self, filename):
-        # Extract date from filename sales_20251128.csv
+    def _streams(self, filename):
+        return self.parser == 'csv' and self.load_mode != 'rows' and filename.endswith(STREAM_SUFFIXES)
+
+    def _prepare_sales_stream(self, filename, batch_date, store_cache, placeholders, archive, counts):
+        """
+        Mesmo contrato de _prepare_sales_chunks sem pandas: o CSV é lido com
+        o módulo csv e cada chunk vira direto o texto do COPY. Gera
+        ((texto CSV, dias do chunk), new_placeholders).
+        """
+        columns = list(SALES_SCHEMA)
+        rejected = RowsWriter(self._rejected_file(filename), columns + ['reject_reason'])
+        quarantined = RowsWriter(self._quarantine_file(filename), columns)
+        dedup = RowDeduplicator(self.duplicate_rule)
+        if dedup.needs_prescan:
+            with metrics.stage('dedup_prescan', file_type='sales'):
+                dedup.prescan(self._stream_keys(filename))
         try:
-            batch_date_str = filename.split('_')[1].replace('.csv', '')
-            batch_date = datetime.strptime(batch_date_str, "%Y%m%d").date()
-        except:
-            batch_date = datetime.now().date()
+            raw_chunks = metrics.timed_iter(self._read_stream_chunks(filename), 'read', file_type='sales')
+            for raw_rows, malformed in raw_chunks:
+                with metrics.stage('clean', file_type='sales'):
+                    kept, new_placeholders = self._clean_stream_chunk(
+                        filename, raw_rows, malformed, store_cache, placeholders, dedup, rejected, quarantined
+                    )
+                    rows = [row[:6] + (batch_date,) for row in kept]
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(
+                        (store, tx, receipt, ts.isoformat(' '), repr(amount), role, batch_date.isoformat())
+                        for store, tx, receipt, ts, amount, role, _ in rows
+                    )
+                counts['total'] += len(raw_rows) + len(malformed)
+                counts['valid'] += len(kept)
+                if archive:
+                    with metrics.stage('archive', file_type='sales'):
+                        archive.write_rows(
+                            (store, tx, receipt or None, ts, amount, role or None, day)
+                            for store, tx, receipt, ts, amount, role, day in rows
+                        )
+                yield (buffer.getvalue(), {row[3].date() for row in kept}), new_placeholders
+        finally:
+            rejected.close()
+            quarantined.close()
+            counts['rejected'] += rejected.rows
+            counts['quarantined'] += quarantined.rows
+            counts['duplicates'] += dedup.duplicates
+            counts['valid'] -= dedup.superseded
 
-        df = pd.read_csv(os.path.join(self.inbox_path, filename))
-        total_rows = len(df)
-        valid_rows = 0
-        
+    def _stream_keys(self, filename):
+        # (store_token, transaction_id) das linhas que passam na validação (prescan da regra 'reject')
+        for raw_rows, _ in self._read_stream_chunks(filename):
+            for store, tx, _, ts_text, amount_text, _ in raw_rows:
+                if not reject_reason(store, tx, parse_time(ts_text), parse_amount(amount_text)):
+                    yield store, tx
+
+    def _read_stream_chunks(self, filename):
+        """
+        Gera (rows, malformed) com até chunk_size linhas, só com as colunas
+        de SALES_SCHEMA (na ordem dele). Linha com outro número de campos que
+        o cabeçalho vai para `malformed` (completada com '' ou cortada, para
+        o rejected): carregá-la desalinharia as colunas, e o leitor pandas
+        recusaria o arquivo inteiro.
+        """
+        with open_text(os.path.join(self.inbox_path, filename)) as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            check_columns(filename, header, SALES_SCHEMA)
+            index = [header.index(col) for col in SALES_SCHEMA]
+            width = len(header)
+            pending, malformed = [], []
+            for fields in reader:
+                if not fields:
+                    continue
+                if len(fields) == width:
+                    pending.append([fields[i] for i in index])
+                else:
+                    fields += [''] * (width - len(fields))
+                    malformed.append([fields[i] for i in index])
+                if len(pending) + len(malformed) >= self.chunk_size:
+                    yield pending, malformed
+                    pending, malformed = [], []
+            if pending or malformed:
+                yield pending, malformed
+
+    def _clean_stream_chunk(self, filename, raw_rows, malformed, store_cache, placeholders, dedup,
+                            rejected, quarantined):
+        """
+        validate_sales + _check_stores + deduplicação, linha a linha.
+        Retorna (kept, new_placeholders); kept tem tuplas
+        (store_token, transaction_id, receipt_token, datetime, float, user_role, raw).
+        """
+        valid, unknown = [], []
+        bad = [raw + ['malformed_row'] for raw in malformed]
+        for raw in raw_rows:
+            store, tx, receipt, ts_text, amount_text, role = raw
+            ts, amount = parse_time(ts_text), parse_amount(amount_text)
+            reason = reject_reason(store, tx, ts, amount)
+            if reason:
+                bad.append(raw + [reason])
+            elif store in store_cache:
+                valid.append((store, tx, receipt, ts, amount, role, raw))
+            else:
+                unknown.append((store, tx, receipt, ts, amount, role, raw))
+
+        new_placeholders = []
+        if unknown:
+            metrics.incr('rows_unknown_store', len(unknown), policy=self.unknown_store_policy)
+            if self.unknown_store_policy == 'placeholder':
+                new_placeholders = sorted({row[0].lower() for row in unknown} - placeholders)
+                placeholders.update(new_placeholders)
+                valid += unknown
+            elif self.unknown_store_policy == 'reject':
+                bad += [row[6] + ['unknown_store'] for row in unknown]
+            else:
+                quarantined.write([row[6] for row in unknown])
+                print(f"{len(unknown)} rows from {filename} with unknown stores quarantined to {quarantined.path}")
+
+        kept, duplicated = dedup.apply(valid)
+        bad += [row[6] + ['duplicate_transaction'] for row in duplicated]
+        if bad:
+            rejected.write(bad)
+            print(f"{len(bad)} invalid rows from {filename} written to {rejected.path}")
+        return kept, new_placeholders
+
+    def _sales_committed(self, archive, store_cache, placeholders, counts):
+        if archive:
+            archive.commit()
+        store_cache.add(placeholders)
+        metrics.incr('rows_read', counts['total'], file_type='sales')
+        metrics.incr('rows_valid', counts['valid'], file_type='sales')
+        metrics.incr('rows_rejected', counts['total'] - counts['valid'], file_type='sales')
+        metrics.incr('rows_duplicate', counts['duplicates'], rule=self.duplicate_rule)
+
+    def _load_sales_chunk(self, cur, sales, touched_dates):
+        chunk_dates = sales['transaction_time'].dt.date.unique()
+        if self.load_mode == 'rows':
+            touched_dates.update(chunk_dates)
+            self._ensure_partitions(chunk_dates)
+            touched_dates.update(self._load_sales_rows(cur, sales))
+        else:
+            self._load_sales_text(cur, sales_copy_data(sales), chunk_dates, touched_dates)
+
+    def _load_sales_text(self, cur, data, chunk_dates, touched_dates):
+        # `data`: linhas já no formato do COPY (sales_copy_data ou parser 'csv')
+        touched_dates.update(chunk_dates)
+        self._ensure_partitions(chunk_dates)
+        touched_dates.update(self._load_sales_copy(cur, data))
+
+    def _ensure_partitions(self, dates):
+        """
+        Cria as partições de fact_sales que faltam para `dates` numa
+        transação curta, commitada antes do load do chunk. O ATTACH
+        PARTITION e o lock de partições não ficam presos à transação do
+        arquivo (que seguraria o pai até o fim do load). Conexão própria,
+        fora do pool: não disputa slot com os arquivos em andamento.
+        """
+        if not partitions.months_to_check(dates, self._known_partitions):
+            return
+        months = set(self._known_partitions)
         conn = self.db.get_connection()
-        cur = conn.cursor()
+        try:
+            partitions.ensure_sales_partitions(conn.cursor(), dates, months)
+            conn.commit()
+        finally:
+            conn.close()
+        # Só depois do commit: partição criada e visível para todos
+        self._known_partitions |= months
+
+    def _refresh_aggregates(self, cur, touched_dates):
+        with metrics.stage('aggregate', file_type='sales'):
+            aggregates.refresh(cur, touched_dates)
+
+    def replay_archive(self, date_from, date_to):
+        """
+        Reconstrói fact_sales (e os agregados) para os dias de venda em
+        [date_from, date_to] a partir do archive Parquet, sem reler os
+        arquivos brutos. Só as chaves presentes no archive são substituídas:
+        linhas carregadas antes do archive existir (ou com ele desligado)
+        ficam como estão. Tudo numa transação: ou o intervalo inteiro é
+        reconstruído, ou nada muda.
+        """
+        files = archived_files(self.archive_path, date_from, date_to)
+        if not files:
+            print(f"No archived sales between {date_from} and {date_to}.")
+            return 0
+
+        days = pd.date_range(date_from, date_to).date
+        touched_dates = set(days)
+        replay_range = {'date_from': date_from, 'date_to': date_to}
+        rows = stale = 0
+
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            # Sempre pela staging (também em load_mode 'rows'): o filtro de versões velhas é set-based
+            self._create_sales_staging(cur)
+            # Ordem de ingestão: versões mais novas de uma transação sobrescrevem as antigas
+            for path in files:
+                for sales in read_archive_chunks(path, self.chunk_size):
+                    sales = sales[SALES_COLUMNS]
+                    self._ensure_partitions(sales['transaction_time'].dt.date.unique())
+                    stale += self._replay_sales_copy(cur, sales_copy_data(sales), replay_range)
+                    rows += len(sales)
+                print(f"Replayed {path}")
+
+            self._refresh_aggregates(cur, touched_dates)
+            conn.commit()
+
+        print(f"Replay finished: {rows - stale} rows from {len(files)} archive files "
+              f"({stale} superseded by newer versions outside the range).")
+        return rows - stale
+
+    def _replay_sales_copy(self, cur, data, replay_range):
+        # Como _load_sales_copy, sem tocar em linhas fora do intervalo do replay.
+        # As versões da chave no intervalo saem antes do merge (que só atualiza
+        # amount): a linha fica exatamente como no archive
+        cur.copy_expert(SALES_COPY_SQL, io.StringIO(data))
+        cur.execute(SALES_LOCK_SQL)
+        cur.execute(REPLAY_STALE_SQL, replay_range)
+        stale = cur.rowcount
+        cur.execute(REPLAY_REPLACE_SQL, replay_range)
+        cur.execute(SALES_MERGE_SQL)
+        cur.execute("TRUNCATE stg_sales;")
+        return stale
 
-        insert_sql = """
-        INSERT INTO analytics.fact_sales 
-        (store_token, transaction_id, receipt_token, transaction_time, amount, user_role, batch_date)
+    def _check_stores(self, valid, rejected, store_cache, placeholders):
+        """
+        Aplica unknown_store_policy às vendas de lojas fora de dim_stores.
+        Retorna (valid, rejected, quarantined, new_placeholders); as lojas
+        placeholder novas ficam a cargo de quem carrega o chunk.
+        """
+        known = store_cache.contains(valid['store_token'])
+        quarantined = valid.iloc[0:0]
+        if known.all():
+            return valid, rejected, quarantined, []
+
+        unknown = valid.loc[~known]
+        metrics.incr('rows_unknown_store', len(unknown), policy=self.unknown_store_policy)
+
+        if self.unknown_store_policy == 'placeholder':
+            new_tokens = sorted(set(unknown['store_token'].str.lower()) - placeholders)
+            placeholders.update(new_tokens)
+            return valid, rejected, quarantined, new_tokens
+
+        if self.unknown_store_policy == 'reject':
+            rejected = pd.concat([rejected, self._as_rejected(unknown, 'unknown_store')])
+        else:
+            quarantined = unknown
+
+        return valid.loc[known], rejected, quarantined, []
+
+    def _as_rejected(self, rows, reason):
+        # Linhas já convertidas pela validação voltam a texto, como as do arquivo
+        return rows.assign(
+            amount=rows['amount'].astype(str),
+            transaction_time=rows['transaction_time'].astype(str),
+            reject_reason=reason
+        )
+
+    def _quarantine_file(self, filename):
+        return os.path.join(self.quarantine_path, f"{file_stem(filename)}_quarantine.csv")
+
+    def _rejected_file(self, filename):
+        return os.path.join(self.rejected_path, f"{file_stem(filename)}_rejected.csv")
+
+    def _write_quarantine(self, quarantined, filename, append=False):
+        # Mesmo layout do inbox: basta devolver o arquivo ao inbox quando a loja chegar
+        path = self._quarantine_file(filename)
+        if append:
+            quarantined.to_csv(path, index=False, mode='a', header=False)
+        else:
+            quarantined.to_csv(path, index=False)
+        print(f"{len(quarantined)} rows from {filename} with unknown stores quarantined to {path}")
+
+    def _write_rejected(self, rejected, filename, append=False):
+        # Uma escrita por chunk com as linhas recusadas + motivo
+        path = self._rejected_file(filename)
+        if append:
+            rejected.to_csv(path, index=False, mode='a', header=False)
+        else:
+            rejected.to_csv(path, index=False)
+        print(f"{len(rejected)} invalid rows from {filename} written to {path}")
+
+    def _load_sales_rows(self, cur, sales):
+        cols = ', '.join(SALES_COLUMNS)
+        # fact_sales é particionada por transaction_time, que entra na PK:
+        # uma transação cujo horário mudou sai da versão antiga antes do insert
+        insert_sql = f"""
+        WITH moved AS (
+            DELETE FROM analytics.fact_sales
+            WHERE store_token = %s AND transaction_id = %s AND transaction_time <> %s
+        )
+        INSERT INTO analytics.fact_sales ({cols})
         VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (store_token, transaction_id)
-        DO UPDATE SET amount = EXCLUDED.amount, transaction_time = EXCLUDED.transaction_time;
+        ON CONFLICT (store_token, transaction_id, transaction_time)
+        DO UPDATE SET amount = EXCLUDED.amount;
         """
 
-        for _, row in df.iterrows():
-            try:
-                # Clean Amount ($63.98 -> 63.98)
-                raw_amt = str(row['amount']).replace('$', '').strip()
-                clean_amount = float(raw_amt)
-                
-                cur.execute(insert_sql, (
-                    row['store_token'], row['transaction_id'], 
-                    row['receipt_token'], row['transaction_time'], 
-                    clean_amount, row['user_role'], batch_date
-                ))
-                valid_rows += 1
-            except Exception as e:
-                continue
+        cur.execute(sales_lock_sql("unnest(%s::uuid[]) AS k(store_token)"),
+                    (list(sales['store_token']),))
 
-        # Log Batch
+        # Dias antigos das chaves que serão sobrescritas (transaction_time pode mudar)
         cur.execute("""
-            INSERT INTO analytics.sys_batch_log 
-            (file_name, batch_date, file_type, total_rows, valid_rows, invalid_rows)
-            VALUES (%s, %s, 'sales', %s, %s, %s)
-            ON CONFLICT (file_name) DO NOTHING;
-        """, (filename, batch_date, total_rows, valid_rows, total_rows - valid_rows))
-
-        conn.commit()
-        conn.close()
\ No newline at end of file
+            SELECT DISTINCT DATE(f.transaction_time)
+            FROM analytics.fact_sales f
+            JOIN unnest(%s::uuid[], %s::uuid[]) AS k(store_token, transaction_id)
+              USING (store_token, transaction_id);
+        """, (list(sales['store_token']), list(sales['transaction_id'])))
+        previous_dates = [r[0] for r in cur.fetchall()]
+
+        # pd.NA (colunas string/category) não é adaptável pelo psycopg2
+        rows = sales.astype(object).where(sales.notna(), None)
+        for row in rows.itertuples(index=False, name=None):
+            cur.execute(insert_sql, (row[0], row[1], row[3]) + row)
+        return previous_dates
+
+    def _create_sales_staging(self, cur):
+        cur.execute(SALES_STAGING_SQL)
+
+    def _load_sales_copy(self, cur, data):
+        cur.copy_expert(SALES_COPY_SQL, io.StringIO(data))
+        cur.execute(SALES_LOCK_SQL)
+        cur.execute(SALES_MOVED_SQL)
+        previous_dates = {r[0] for r in cur.fetchall()}
+        cur.execute(SALES_MERGE_SQL)
+        cur.execute("TRUNCATE stg_sales;")
+        return previous_dates
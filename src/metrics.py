@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("pipeline.metrics")
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _prom_escape(value):
+    # Formato texto do Prometheus: \, " e quebra de linha escapados no valor do label
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels)
+    return "{" + inner + "}"
+
+
+class Metrics:
+    """
+    Tempos por etapa e contadores do pipeline. Cada observação vira uma
+    linha JSON no logger `pipeline.metrics`; o acumulado pode ser exportado
+    no formato texto do Prometheus (arquivo ou endpoint local).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}   # (name, labels) -> [count, total_seconds]
+        self._counters = {}  # (name, labels) -> value
+        self.prometheus_file = None
+        self._server = None
+
+    def configure(self, cfg):
+        cfg = cfg or {}
+        if cfg.get('log_path'):
+            os.makedirs(os.path.dirname(cfg['log_path']) or ".", exist_ok=True)
+            handler = logging.FileHandler(cfg['log_path'])
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        self.prometheus_file = cfg.get('prometheus_file')
+        if cfg.get('prometheus_port'):
+            self.serve(int(cfg['prometheus_port']))
+
+    @contextmanager
+    def stage(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed_iter(self, iterable, name, **labels):
+        # Mede só o tempo gasto dentro de next() (ex.: parse de cada chunk)
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.observe(name, time.perf_counter() - start, **labels)
+                return
+            self.observe(name, time.perf_counter() - start, **labels)
+            yield item
+
+    def observe(self, name, seconds, **labels):
+        with self._lock:
+            entry = self._timings.setdefault(_key(name, labels), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "ts": time.time(), "type": "timing", "stage": name,
+                "seconds": round(seconds, 6), **labels
+            }, default=str))
+
+    def incr(self, name, value=1, **labels):
+        with self._lock:
+            key = _key(name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "ts": time.time(), "type": "counter", "name": name,
+                "value": value, **labels
+            }, default=str))
+
+    def event(self, name, **fields):
+        # Só log estruturado (ex.: resumo por arquivo), sem acumular
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"ts": time.time(), "type": "event", "name": name, **fields},
+                                   default=str))
+
+    def snapshot(self):
+        with self._lock:
+            timings = {k: list(v) for k, v in self._timings.items()}
+            counters = dict(self._counters)
+        return timings, counters
+
+    def to_prometheus(self):
+        timings, counters = self.snapshot()
+        lines = [
+            "# TYPE pipeline_stage_seconds summary",
+        ]
+        for (name, labels), (count, total) in sorted(timings.items()):
+            all_labels = (("stage", name),) + labels
+            lines.append(f"pipeline_stage_seconds_sum{_prom_labels(all_labels)} {total:.6f}")
+            lines.append(f"pipeline_stage_seconds_count{_prom_labels(all_labels)} {count}")
+        last_name = None
+        for (name, labels), value in sorted(counters.items()):
+            if name != last_name:
+                lines.append(f"# TYPE pipeline_{name}_total counter")
+                last_name = name
+            lines.append(f"pipeline_{name}_total{_prom_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prometheus_file
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Escrita atômica: o textfile collector nunca lê um arquivo pela metade
+        with open(f"{path}.tmp", "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{path}.tmp", path)
+
+    def serve(self, port):
+        if self._server is not None:
+            return
+        # http.server só é importado quando o exporter está ligado
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://127.0.0.1:{port}/metrics")
+
+    def print_summary(self):
+        timings, counters = self.snapshot()
+        if not timings:
+            return
+        print("--- Stage timings ---")
+        totals = {}
+        for (name, labels), (count, total) in timings.items():
+            label = name + "".join(f" {k}={v}" for k, v in labels)
+            totals[label] = (count, total)
+        for label, (count, total) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+            print(f"{label}: {total:.3f}s ({count} calls)")
+
+
+# Registro único do processo, compartilhado por ingestão e relatórios
+metrics = Metrics()
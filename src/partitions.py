@@ -0,0 +1,66 @@
+# Partições mensais de analytics.fact_sales, criadas sob demanda pela ingestão.
+from datetime import date
+
+PARTITION_LOCK_KEY = 'analytics.fact_sales.partitions'
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def next_month(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"fact_sales_{month:%Y%m}"
+
+
+EXISTS_SQL = "SELECT to_regclass(%s);"
+LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s));"
+
+
+def months_to_check(dates, known):
+    return sorted({month_start(d) for d in dates} - known)
+
+
+def create_statements(month):
+    """
+    (sql, params) que criam a partição de `month`. A tabela é criada solta e
+    depois anexada com ATTACH PARTITION, que só pega SHARE UPDATE EXCLUSIVE
+    no pai: loads e relatórios concorrentes continuam rodando. Roda numa
+    transação curta à parte (IngestionEngine._ensure_partitions), nunca na
+    transação do arquivo.
+    """
+    name = partition_name(month)
+    return [
+        (f"""
+            CREATE TABLE analytics.{name}
+            (LIKE analytics.fact_sales INCLUDING DEFAULTS);
+        """, None),
+        (f"""
+            ALTER TABLE analytics.fact_sales ATTACH PARTITION analytics.{name}
+            FOR VALUES FROM (%s) TO (%s);
+        """, (month, next_month(month))),
+    ]
+
+
+def ensure_sales_partitions(cur, dates, known=None):
+    """
+    Garante que existe uma partição de fact_sales para cada mês em `dates`.
+    `known` é um set opcional de meses já verificados (evita ida ao banco).
+    """
+    known = known if known is not None else set()
+    for month in months_to_check(dates, known):
+        name = f"analytics.{partition_name(month)}"
+        cur.execute(EXISTS_SQL, (name,))
+        if cur.fetchone()[0] is None:
+            # Dois workers no mesmo mês novo: o segundo espera e revê o catálogo
+            cur.execute(LOCK_SQL, (PARTITION_LOCK_KEY,))
+            cur.execute(EXISTS_SQL, (name,))
+            if cur.fetchone()[0] is None:
+                for sql, params in create_statements(month):
+                    cur.execute(sql, params)
+                print(f"Created partition {name}")
+        known.add(month)
+    return known
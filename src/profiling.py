@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# PIPELINE_PROFILE=1|sampling|cprofile liga o profiling sem mexer no config
+PROFILE_ENV = "PIPELINE_PROFILE"
+MODES = ('sampling', 'cprofile')
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+class Profiler:
+    """
+    Profiling opt-in por arquivo (ingestão) ou relatório, gravado em
+    data/profiles/.
+
+    - sampling (padrão): uma thread amostra a pilha da thread que processa
+      o arquivo a cada `interval_ms`. Tempo de parede (inclui espera no
+      banco), overhead baixo e funciona com workers em paralelo. Saída em
+      pilhas "folded" (flamegraph.pl, speedscope) + resumo top-N.
+    - cprofile: cProfile determinístico (.prof para pstats/snakeviz) +
+      resumo top-N. Mais caro; no Python 3.12+ só um cProfile roda por
+      vez, então arquivos concorrentes ficam sem profile.
+    """
+
+    def __init__(self, cfg=None):
+        cfg = cfg or {}
+        env = os.environ.get(PROFILE_ENV, "").strip().lower()
+        self.enabled = bool(cfg.get('enabled', False)) or env not in ("", "0", "false")
+        self.mode = env if env in MODES else cfg.get('mode', 'sampling')
+        if self.mode not in MODES:
+            raise ValueError(f"profiling.mode must be one of {MODES}, got {self.mode!r}")
+        self.path = cfg.get('path', "data/profiles/")
+        self.top = int(cfg.get('top', 20))
+        self.interval = float(cfg.get('interval_ms', 5)) / 1000
+
+    @contextmanager
+    def profile(self, kind, name):
+        if not self.enabled:
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        base = os.path.join(self.path, f"{kind}_{_safe_name(name)}_{stamp}")
+        if self.mode == 'cprofile':
+            with self._cprofile(base, name):
+                yield
+        else:
+            with self._sampling(base, name):
+                yield
+
+    @contextmanager
+    def _cprofile(self, base, name):
+        import cProfile
+        import io
+        import pstats
+
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # 3.12+: outro cProfile já ativo (arquivos em paralelo)
+            print(f"Profiling skipped for {name}: another cProfile is active (use mode 'sampling' or workers: 1)")
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(f"{base}.prof")
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(self.top)
+            with open(f"{base}.txt", "w", encoding="utf-8") as f:
+                f.write(out.getvalue())
+            print(f"Profile for {name}: {base}.prof ({base}.txt)")
+
+    @contextmanager
+    def _sampling(self, base, name):
+        target = threading.get_ident()
+        stacks = Counter()
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks[";".join(reversed(stack))] += 1
+
+        sampler = threading.Thread(target=sample, name=f"profiler-{name}", daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            done.set()
+            sampler.join()
+            self._write_sampling(base, name, stacks, time.perf_counter() - start)
+
+    def _write_sampling(self, base, name, stacks, elapsed):
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        total = sum(stacks.values())
+        own, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        lines = [f"{name}: {total} samples in {elapsed:.2f}s (every {self.interval * 1000:g} ms)", "",
+                 "self  (% of samples)"]
+        lines += [f"{100 * n / total:6.1f}%  {frame}" for frame, n in own.most_common(self.top)] if total else []
+        lines += ["", "total (% of samples)"]
+        lines += [f"{100 * n / total:6.1f}%  {frame}" for frame, n in inclusive.most_common(self.top)] if total else []
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        hottest = f", hottest: {own.most_common(1)[0][0]}" if total else ""
+        print(f"Profile for {name}: {base}.folded ({base}.txt{hottest})")
@@ -0,0 +1,132 @@
+# Leitura em chunks dos formatos aceitos no inbox, sem descompactar em disco.
+import os
+
+import pandas as pd
+
+from src.schema import apply_schema, check_columns, read_dtypes, text_dtype
+
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+PARQUET_SUFFIXES = ('.parquet',)
+ARROW_SUFFIXES = ('.arrow', '.feather')
+INBOX_SUFFIXES = CSV_SUFFIXES + PARQUET_SUFFIXES + ARROW_SUFFIXES
+
+
+def file_stem(filename):
+    # sales_20251128.csv.gz -> sales_20251128
+    for suffix in sorted(INBOX_SUFFIXES, key=len, reverse=True):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def require_pyarrow(filename):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"pyarrow is required to read {filename} (pip install pyarrow)")
+
+
+def read_chunks(path, schema, chunk_size):
+    """
+    Itera DataFrames de até `chunk_size` linhas com as colunas de `schema`
+    (src/schema.py). O cabeçalho é conferido antes da primeira linha:
+    coluna faltando levanta SchemaError.
+    CSV (puro, .gz ou .zst) é lido como texto com os tipos declarados, pelo
+    leitor CSV do pyarrow quando disponível; Parquet/Arrow mantêm os tipos
+    nativos, que a validação já aceita.
+    """
+    columns = list(schema)
+    filename = os.path.basename(path)
+    if path.endswith(PARQUET_SUFFIXES):
+        require_pyarrow(path)
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        check_columns(filename, parquet_file.schema_arrow.names, schema)
+        return _read_parquet_chunks(parquet_file, columns, schema, chunk_size)
+    if path.endswith(ARROW_SUFFIXES):
+        return _read_arrow_chunks(path, columns, schema, chunk_size)
+
+    dtypes = read_dtypes(schema)
+    if text_dtype() is not object:
+        return _read_csv_arrow(path, dtypes, chunk_size)
+    # compression='infer': gzip/zstd descompactados em streaming pelo pandas
+    header = pd.read_csv(path, nrows=0, compression='infer').columns
+    check_columns(filename, header, schema)
+    return pd.read_csv(path, dtype=dtypes, usecols=columns, engine='c',
+                       chunksize=chunk_size, compression='infer')
+
+
+def _read_csv_arrow(path, dtypes, chunk_size):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    # compression='detect': .gz/.zst pela extensão, em streaming
+    source = pa.input_stream(path, compression='detect')
+    try:
+        reader = pa_csv.open_csv(
+            source,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=list(dtypes),
+                column_types={col: pa.string() for col in dtypes},
+                # Só campo vazio vira nulo: "N/A" em amount chega intacto ao rejected
+                null_values=[''],
+                strings_can_be_null=True,
+            ),
+        )
+        check_columns(os.path.basename(path), reader.schema.names, dtypes)
+    except KeyError:
+        # include_columns recusa o arquivo antes do check_columns: relê só o
+        # cabeçalho para levantar o mesmo SchemaError do leitor pandas
+        source.close()
+        with pa.input_stream(path, compression='detect') as header_source:
+            header = pa_csv.open_csv(header_source).schema.names
+        check_columns(os.path.basename(path), header, dtypes)
+        raise
+    except Exception:
+        source.close()
+        raise
+    return _csv_arrow_chunks(source, reader, dtypes, chunk_size)
+
+
+def _csv_arrow_chunks(source, reader, dtypes, chunk_size):
+    import pyarrow as pa
+
+    # Os blocos do leitor têm tamanho em bytes: reagrupa em chunks de `chunk_size` linhas
+    with source:
+        pending, rows = [], 0
+        for batch in reader:
+            pending.append(batch)
+            rows += batch.num_rows
+            while rows >= chunk_size:
+                table = pa.Table.from_batches(pending)
+                yield _to_pandas(table.slice(0, chunk_size), dtypes)
+                rest = table.slice(chunk_size)
+                pending, rows = rest.to_batches(), rest.num_rows
+        if rows:
+            yield _to_pandas(pa.Table.from_batches(pending, reader.schema), dtypes)
+
+
+def _to_pandas(table, dtypes):
+    import pyarrow as pa
+
+    text = {pa.string(): pd.StringDtype('pyarrow')}
+    return table.to_pandas(types_mapper=text.get).astype(dtypes)
+
+
+def _read_parquet_chunks(parquet_file, columns, schema, chunk_size):
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield apply_schema(batch.to_pandas(), schema)
+
+
+def _read_arrow_chunks(path, columns, schema, chunk_size):
+    require_pyarrow(path)
+    import pyarrow as pa
+
+    # memory_map: o SO pagina o arquivo sob demanda, sem carregá-lo inteiro
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        check_columns(os.path.basename(path), reader.schema.names, schema)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i).select(columns)
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield apply_schema(batch.slice(offset, chunk_size).to_pandas(), schema)
@@ -1,21 +1,153 @@
-import pandas as pd
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from src.database import Database
+from src.metrics import metrics
+from src.profiling import Profiler
+
+# Nome do relatório -> método que o gera
+REPORTS = {
+    'batches': '_output_1_batch_log',
+    'daily_sales': '_output_2_sales_metrics',
+    'top_stores': '_output_3_top_stores',
+}
+
+# Marca d'água dos dados: todo load (lojas ou vendas) grava/atualiza o sys_batch_log.
+# CURRENT_DATE entra porque os relatórios trazem snapshot_date.
+WATERMARK_SQL = """
+    SELECT CURRENT_DATE, COUNT(*), MAX(processed_at) FROM analytics.sys_batch_log;
+"""
+
+CACHE_FILE = ".report_cache.json"
+
+
+def report_key(query, watermark):
+    # A query entra na chave: mudar a config (ex.: lookback) também invalida o CSV
+    return hashlib.sha256(f"{watermark}|{query}".encode()).hexdigest()
 
 class ReportGenerator:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None, date_from=None, date_to=None):
+        # Pool compartilhado com o IngestionEngine quando `db` é passado
+        self.db = db or Database()
+        self.cfg = self.db.config.get('reporting') or {}
+        # Só os últimos N dias (a partir do dia mais recente com vendas) são ranqueados
+        self.top_stores_lookback_days = int(self.cfg.get('top_stores_lookback_days', 40))
+        # Relatórios gerados em paralelo, cada um na sua conexão do pool
+        self.workers = int(self.cfg.get('workers', 3))
         self.output_path = "data/output/"
+        # Backfill: limita os relatórios a [date_from, date_to] (datetime.date);
+        # sem limites, cada relatório mostra os dias mais recentes
+        self.date_from = date_from
+        self.date_to = date_to
+        # Pula relatórios cujos dados não mudaram desde a última geração
+        self.cache_enabled = bool(self.cfg.get('cache', True))
+        self.cache_path = os.path.join(self.output_path, CACHE_FILE)
+        # Profiling opt-in por relatório (src/profiling.py)
+        self.profiler = Profiler(self.db.config.get('profiling'))
         os.makedirs(self.output_path, exist_ok=True)
 
-    def generate_all(self):
-        print("Generating reports...")
-        self._output_1_batch_log()
-        self._output_2_sales_metrics()
-        self._output_3_top_stores()
+    def generate_all(self, force=False):
+        return self.generate(REPORTS, force=force)
+
+    def generate(self, names, force=False):
+        """
+        Gera os relatórios em `names`. Com reporting.cache, os que já foram
+        gerados com a mesma marca d'água (e a mesma query) são pulados;
+        `force` ignora o cache (ex.: replay, que não passa pelo sys_batch_log).
+        Retorna False se algum relatório falhou.
+        """
+        watermark = self._watermark() if self.cache_enabled else None
+        reports = self._stale(self.queries(names), watermark, force)
+        if not reports:
+            print("Reports up to date (no new data since last run).")
+            return True
+        print(f"Generating reports: {', '.join(f for _, f in reports)}...")
+        if self.workers <= 1 or len(reports) <= 1:
+            done = [self._save_csv(query, filename) for query, filename in reports]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._save_csv, *report) for report in reports]
+                done = [future.result() for future in futures]
+        self._remember(reports, done, watermark)
+        return all(done)
+
+    def _watermark(self):
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(WATERMARK_SQL)
+            return str(cur.fetchone())
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _stale(self, reports, watermark, force=False):
+        # Relatórios cujo CSV falta ou foi gerado com outra marca d'água/query
+        if watermark is None or force:
+            return reports
+        cache = self._load_cache()
+        stale = []
+        for query, filename in reports:
+            fresh = cache.get(filename) == report_key(query, watermark)
+            if fresh and os.path.exists(f"{self.output_path}{filename}"):
+                metrics.incr('report_cache', report=filename, outcome='hit')
+                print(f"{filename} up to date, skipped.")
+            else:
+                metrics.incr('report_cache', report=filename, outcome='miss')
+                stale.append((query, filename))
+        return stale
+
+    def _remember(self, reports, done, watermark):
+        # Só relatórios gerados com sucesso entram no cache
+        if watermark is None:
+            return
+        cache = self._load_cache()
+        for (query, filename), ok in zip(reports, done):
+            if ok:
+                cache[filename] = report_key(query, watermark)
+            else:
+                cache.pop(filename, None)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+    def queries(self, names):
+        # (query, arquivo) de cada relatório; o AsyncReportGenerator reusa as mesmas queries
+        return [getattr(self, REPORTS[name])() for name in names]
+
+    def _bounded(self):
+        return self.date_from is not None or self.date_to is not None
+
+    def _date_filter(self, column):
+        # date.isoformat() só tem dígitos e hífens: seguro para ir literal no SQL
+        # (as queries rodam dentro de COPY, que não aceita parâmetros)
+        clauses = []
+        if self.date_from is not None:
+            clauses.append(f"{column} >= DATE '{self.date_from.isoformat()}'")
+        if self.date_to is not None:
+            clauses.append(f"{column} <= DATE '{self.date_to.isoformat()}'")
+        return "".join(f" AND {clause}" for clause in clauses)
+
+    def _limit(self, rows):
+        # Só com --to (sem --from): os N dias mais recentes até --to
+        return "" if self.date_from is not None else f"LIMIT {rows}"
+
+    def _filename(self, filename):
+        # Backfill não sobrescreve os CSVs do dia: output_1_batches_20251101_20251130.csv
+        if not self._bounded():
+            return filename
+        stem, ext = os.path.splitext(filename)
+        bounds = [d.strftime('%Y%m%d') if d else '' for d in (self.date_from, self.date_to)]
+        return f"{stem}_{bounds[0]}_{bounds[1]}{ext}"
 
     def _output_1_batch_log(self):
-        query = """
+        query = f"""
         SELECT 
             CURRENT_DATE as snapshot_date,
             batch_date,
@@ -23,42 +155,68 @@ class ReportGenerator:
             SUM(valid_rows) as valid_rows,
             SUM(invalid_rows) as ignored_rows
         FROM analytics.sys_batch_log
+        WHERE file_type = 'sales'{self._date_filter('batch_date')}
         GROUP BY batch_date
         ORDER BY batch_date DESC
-        LIMIT 40;
+        {self._limit(40)};
         """
-        self._save_csv(query, "output_1_batches.csv")
+        return query, self._filename("output_1_batches.csv")
 
     def _output_2_sales_metrics(self):
-        query = """
+        # Lê o agregado diário mantido pela ingestão (src/aggregates.py).
+        # O acumulado do mês precisa dos dias anteriores ao primeiro exibido:
+        # a janela começa no 1º dia do mês dele (varredura pela PK)
+        if self.date_from is not None:
+            window_start = f"DATE_TRUNC('month', DATE '{self.date_from.isoformat()}')::date"
+        else:
+            window_start = f"""(
+                SELECT DATE_TRUNC('month', MIN(sales_date))::date
+                FROM (
+                    SELECT sales_date FROM analytics.agg_daily_sales
+                    WHERE TRUE{self._date_filter('sales_date')}
+                    ORDER BY sales_date DESC LIMIT 40
+                ) recent
+            )"""
+        query = f"""
+        WITH Daily AS (
+            SELECT
+                sales_date,
+                active_stores,
+                total_sales,
+                transaction_count,
+                SUM(total_sales) OVER (
+                    PARTITION BY TO_CHAR(sales_date, 'YYYY-MM')
+                    ORDER BY sales_date
+                ) as mtd_sales_accumulated
+            FROM analytics.agg_daily_sales
+            WHERE sales_date >= {window_start}
+        )
         SELECT 
             CURRENT_DATE as snapshot_date,
-            DATE(transaction_time) as transaction_date,
-            COUNT(DISTINCT store_token) as active_stores,
-            SUM(amount) as total_sales,
-            AVG(amount) as avg_sales,
-            SUM(SUM(amount)) OVER (
-                PARTITION BY TO_CHAR(DATE(transaction_time), 'YYYY-MM') 
-                ORDER BY DATE(transaction_time)
-            ) as mtd_sales_accumulated
-        FROM analytics.fact_sales
-        GROUP BY DATE(transaction_time)
+            sales_date as transaction_date,
+            active_stores,
+            total_sales,
+            total_sales / NULLIF(transaction_count, 0) as avg_sales,
+            mtd_sales_accumulated
+        FROM Daily
+        WHERE TRUE{self._date_filter('sales_date')}
         ORDER BY transaction_date DESC
-        LIMIT 40;
+        {self._limit(40)};
         """
-        self._save_csv(query, "output_2_daily_sales.csv")
+        return query, self._filename("output_2_daily_sales.csv")
 
     def _output_3_top_stores(self):
-        query = """
+        # Ranking sobre o rollup dia x loja mantido pela ingestão (src/aggregates.py)
+        query = f"""
         WITH DailyStats AS (
             SELECT 
-                DATE(transaction_time) as t_date,
+                a.sales_date as t_date,
                 s.store_token,
                 s.store_name,
-                SUM(fs.amount) as total
-            FROM analytics.fact_sales fs
-            JOIN analytics.dim_stores s ON fs.store_token = s.store_token
-            GROUP BY 1, 2, 3
+                a.total_sales as total
+            FROM analytics.agg_store_daily_sales a
+            JOIN analytics.dim_stores s ON a.store_token = s.store_token
+            WHERE {self._top_stores_range()}
         ),
         Ranked AS (
             SELECT *, DENSE_RANK() OVER (PARTITION BY t_date ORDER BY total DESC) as rnk
@@ -69,14 +227,37 @@ class ReportGenerator:
         WHERE rnk <= 5
         ORDER BY t_date DESC, rnk ASC;
         """
-        self._save_csv(query, "output_3_top_stores.csv")
+        return query, self._filename("output_3_top_stores.csv")
+
+    def _top_stores_range(self):
+        # Sem --from: os últimos N dias até --to (ou até o dia mais recente com vendas)
+        if self.date_from is not None:
+            return f"TRUE{self._date_filter('a.sales_date')}"
+        if self.date_to is not None:
+            anchor = f"DATE '{self.date_to.isoformat()}'"
+        else:
+            anchor = "(SELECT MAX(sales_date) FROM analytics.agg_store_daily_sales)"
+        return f"a.sales_date > {anchor} - {self.top_stores_lookback_days}{self._date_filter('a.sales_date')}"
 
     def _save_csv(self, query, filename):
+        # COPY TO STDOUT grava direto no disco, sem montar DataFrame em memória
+        path = f"{self.output_path}{filename}"
+        tmp_path = f"{path}.tmp"
+        copy_sql = f"COPY ({query.strip().rstrip(';')}) TO STDOUT WITH CSV HEADER"
+        start = time.perf_counter()
         try:
-            conn = self.db.get_connection()
-            df = pd.read_sql(query, conn)
-            df.to_csv(f"{self.output_path}{filename}", index=False)
-            print(f"Generated {filename}")
-            conn.close()
+            with self.profiler.profile('report', filename), metrics.stage('report', report=filename), \
+                    self.db.connection() as conn:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    conn.cursor().copy_expert(copy_sql, f)
+            # Troca atômica: leitores nunca veem um CSV pela metade
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            metrics.incr('report_bytes', size, report=filename)
+            print(f"Generated {filename} ({size} bytes in {time.perf_counter() - start:.2f}s)")
+            return True
         except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             print(f"Error generating {filename}: {e}")
+            return False
@@ -0,0 +1,52 @@
+# Schema declarado de cada tipo de arquivo do inbox (colunas de sql/init.sql).
+import pandas as pd
+
+# Texto: UUIDs/tokens/nomes chegam como texto e são validados em src/validation.py
+# (amount vem como "$63.98"; transaction_time inválido precisa ir intacto ao rejected).
+# 'category': poucos valores distintos repetidos em todas as linhas.
+STORES_SCHEMA = {
+    'store_group': 'text',    # VARCHAR(50)
+    'store_token': 'text',    # UUID
+    'store_name': 'text',     # VARCHAR(255)
+}
+SALES_SCHEMA = {
+    'store_token': 'text',       # UUID
+    'transaction_id': 'text',    # UUID
+    'receipt_token': 'text',     # VARCHAR
+    'transaction_time': 'text',  # TIMESTAMP (convertido na validação)
+    'amount': 'text',            # NUMERIC(12,2) (convertido na validação)
+    'user_role': 'category',     # VARCHAR(50)
+}
+
+
+class SchemaError(ValueError):
+    """Arquivo do inbox sem as colunas declaradas para o seu tipo."""
+
+
+def text_dtype():
+    # Strings em buffer Arrow (bem menos memória que objetos str) quando há pyarrow
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return pd.StringDtype('pyarrow')
+
+
+def read_dtypes(schema):
+    text = text_dtype()
+    return {col: text if kind == 'text' else kind for col, kind in schema.items()}
+
+
+def check_columns(filename, columns, schema):
+    # Falha antes de qualquer load: arquivo trocado ou upstream mudou o layout
+    missing = [col for col in schema if col not in set(columns)]
+    if missing:
+        raise SchemaError(
+            f"{filename}: missing columns {missing} (found {list(columns)})"
+        )
+
+
+def apply_schema(df, schema):
+    # Parquet/Arrow mantêm os tipos nativos; só as categóricas são convertidas
+    categorical = {col: 'category' for col, kind in schema.items() if kind == 'category'}
+    return df.astype(categorical) if categorical else df
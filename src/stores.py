@@ -0,0 +1,44 @@
+import threading
+
+from src.validation import as_text
+
+TOKENS_SQL = "SELECT store_token::text FROM analytics.dim_stores;"
+
+
+class StoreCache:
+    """
+    Tokens de analytics.dim_stores em memória, carregados uma vez por
+    execução e atualizados a cada arquivo de lojas processado. A checagem
+    das vendas é feita em bloco (Series.isin), sem consulta por linha.
+    """
+
+    def __init__(self, tokens=()):
+        self._lock = threading.Lock()
+        # frozenset trocado inteiro a cada add: leituras não precisam de lock
+        self._tokens = frozenset(str(t).lower() for t in tokens)
+
+    @classmethod
+    def load(cls, cur):
+        cur.execute(TOKENS_SQL)
+        return cls(row[0] for row in cur.fetchall())
+
+    def __getstate__(self):
+        return {'_tokens': self._tokens}
+
+    def __setstate__(self, state):
+        self._lock = threading.Lock()
+        self._tokens = state['_tokens']
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return token.lower() in self._tokens
+
+    def add(self, tokens):
+        new = {str(t).lower() for t in tokens}
+        with self._lock:
+            self._tokens = self._tokens | new
+
+    def contains(self, col):
+        return as_text(col).str.lower().isin(self._tokens).to_numpy()
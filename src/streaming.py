@@ -0,0 +1,180 @@
+# Parser de vendas sem pandas: csv do stdlib linha a linha, direto para o buffer do COPY.
+# Mesmas regras de src/validation.py e src/dedup.py, uma linha por vez.
+import csv
+import gzip
+import io
+import math
+import re
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+from src.dedup import SeenKeys, contains_keys, repeated_keys
+from src.validation import MAX_AMOUNT, TIME_PATTERN, UUID_PATTERN
+
+STREAM_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+
+_UUID = re.compile(UUID_PATTERN)
+_TIME = re.compile(TIME_PATTERN)
+
+# Chaves convertidas para array por vez no prescan da regra 'reject'
+_PRESCAN_BATCH = 100000
+
+
+def open_text(path):
+    # gzip/zstd descompactados em streaming, como no leitor pandas.
+    # utf-8-sig: cabeçalho com BOM (Excel) lido igual ao leitor do pyarrow
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"zstandard is required to read {path} (pip install zstandard)")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def parse_time(text):
+    # Mesma regra de src/validation.py (TIME_PATTERN): o fuso já fica fora do grupo 1
+    # e fromisoformat trunca a fração em microssegundos, como o floor('us') de lá
+    match = _TIME.fullmatch(text.strip())
+    if not match:
+        return None
+    try:
+        return datetime.fromisoformat(match.group(1))
+    except ValueError:
+        return None
+
+
+def parse_amount(text):
+    # $63.98 -> 63.98 ; texto inválido, não finito ou fora de NUMERIC(12,2) -> None
+    text = text.replace('$', '').strip()
+    if '_' in text:
+        return None
+    try:
+        amount = float(text)
+    except ValueError:
+        return None
+    if not math.isfinite(amount) or abs(amount) >= MAX_AMOUNT:
+        return None
+    return amount
+
+
+def reject_reason(store_token, transaction_id, transaction_time, amount):
+    """Primeiro motivo que falhou (mesma ordem de validate_sales) ou None."""
+    if not _UUID.fullmatch(store_token):
+        return 'invalid_store_token'
+    if not _UUID.fullmatch(transaction_id):
+        return 'invalid_transaction_id'
+    if transaction_time is None:
+        return 'invalid_transaction_time'
+    if amount is None:
+        return 'invalid_amount'
+    return None
+
+
+class RowDeduplicator:
+    """
+    duplicate_rule (src/dedup.py) aplicada a linhas já validadas, tuplas
+    (store_token, transaction_id, receipt_token, transaction_time, ...).
+    As chaves já vistas no arquivo ficam no mesmo SeenKeys compacto do
+    SalesDeduplicator (32 bytes por chave), para valer também entre chunks;
+    só o chunk atual fica num dict. `duplicates` acumula o total e
+    `superseded` as mantidas que substituem uma chave de chunk anterior.
+    Na regra 'reject', prescan() conta as chaves do arquivo inteiro antes.
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.duplicates = 0
+        self.superseded = 0
+        self._seen = SeenKeys(times=rule == 'latest')
+        self._repeated = None
+
+    @staticmethod
+    def _key(store_token, transaction_id):
+        # Os 32 bytes dos dois UUIDs: exato e sem diferença de maiúsculas (como no Postgres)
+        return bytes.fromhex(store_token.replace('-', '') + transaction_id.replace('-', ''))
+
+    @property
+    def needs_prescan(self):
+        return self.rule == 'reject'
+
+    def prescan(self, keys):
+        # Primeira passada ('reject'): pares (store_token, transaction_id) das linhas válidas,
+        # convertidos em arrays 'S32' em lotes (nada de um objeto Python por chave)
+        keys = iter(keys)
+        batches = iter(lambda: list(islice(keys, _PRESCAN_BATCH)), [])
+        self._repeated = repeated_keys(self._keys(batch) for batch in batches)
+
+    def _keys(self, pairs):
+        return np.array([self._key(store_token, transaction_id) for store_token, transaction_id in pairs],
+                        dtype='S32')
+
+    def apply(self, rows):
+        """Retorna (kept, rejected); `rejected` só tem linhas na regra 'reject'."""
+        if self.rule == 'reject':
+            if self._repeated is None:
+                raise RuntimeError("duplicate_rule 'reject' needs prescan() over the whole file first")
+            drop = contains_keys(self._repeated, self._keys((row[0], row[1]) for row in rows))
+            kept = [row for row, d in zip(rows, drop) if not d]
+            rejected = [row for row, d in zip(rows, drop) if d]
+            self.duplicates += len(rejected)
+            return kept, rejected
+
+        latest = self.rule == 'latest'
+        chunk = {}
+        for row in rows:
+            k = self._key(row[0], row[1])
+            current = chunk.get(k)
+            if current is not None:
+                self.duplicates += 1
+                if latest and row[3] < current[3]:
+                    continue
+                # Reinsere no fim: mesma posição que a última ocorrência teria
+                del chunk[k]
+            chunk[k] = row
+
+        if not chunk:
+            return [], []
+        rows = list(chunk.values())
+        keys = np.array(list(chunk), dtype='S32')
+        pos, seen = self._seen.lookup(keys)
+        keep = np.ones(len(rows), dtype=bool)
+        times = None
+        if latest:
+            # Versão mais nova já carregada por um chunk anterior vence
+            times = np.array([row[3] for row in rows], dtype='datetime64[us]')
+            keep[seen] = times[seen] >= self._seen.times[pos[seen]]
+        self.duplicates += int(seen.sum())
+        self.superseded += int((seen & keep).sum())
+        self._seen.add(keys[keep], times[keep] if latest else None)
+        return [row for row, k in zip(rows, keep) if k], []
+
+
+class RowsWriter:
+    """CSV aberto só na primeira linha (com cabeçalho), como o rejected/quarentena do pandas."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.header)
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
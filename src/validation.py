@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+UUID_PATTERN = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+
+# NUMERIC(12,2) em analytics.fact_sales
+MAX_AMOUNT = 10 ** 10
+
+# transaction_time aceito pelos dois parsers (pandas e src/streaming.py): data ISO 8601
+# com hora opcional. O grupo 1 é o que vira TIMESTAMP (truncado em microssegundos);
+# o fuso é descartado, como o Postgres faz num TIMESTAMP. Sem lookaround: o pandas
+# pode rodar a regex no RE2 do pyarrow.
+TIME_PATTERN = (
+    r"(\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,9})?)?)?)"
+    r"(?:Z|[+-]\d{2}(?::?\d{2})?)?"
+)
+
+
+def as_text(col):
+    # Colunas já lidas como string (src/schema.py) não são copiadas para objetos str
+    return col if isinstance(col.dtype, pd.StringDtype) else col.astype(str)
+
+
+def parse_amount(col):
+    # $63.98 -> 63.98 ; texto inválido vira NaN
+    return pd.to_numeric(
+        as_text(col).str.replace('$', '', regex=False).str.strip(),
+        errors='coerce'
+    ).astype('float64')
+
+
+def parse_time(col):
+    # Fora de TIME_PATTERN ou data/hora inexistente (2025-02-30, 24:00) vira NaT
+    local = as_text(col).str.strip().str.extract(f"^{TIME_PATTERN}$", expand=False)
+    return pd.to_datetime(local, format='ISO8601', errors='coerce').dt.floor('us')
+
+
+def is_uuid(col):
+    return as_text(col).str.fullmatch(UUID_PATTERN).fillna(False).to_numpy(dtype=bool)
+
+
+def validate_sales(df):
+    """
+    Valida o arquivo de vendas coluna a coluna, sem loop em Python.
+    Retorna (valid, rejected): `valid` com amount/transaction_time já
+    convertidos e `rejected` com as linhas originais + reject_reason.
+    """
+    amount = parse_amount(df['amount'])
+    transaction_time = parse_time(df['transaction_time'])
+
+    checks = [
+        ('invalid_store_token', ~is_uuid(df['store_token'])),
+        ('invalid_transaction_id', ~is_uuid(df['transaction_id'])),
+        ('invalid_transaction_time', transaction_time.isna().to_numpy()),
+        ('invalid_amount', (amount.isna() | (amount.abs() >= MAX_AMOUNT)).to_numpy()),
+    ]
+    invalid = np.logical_or.reduce([failed for _, failed in checks])
+
+    valid = df.loc[~invalid].assign(
+        amount=amount[~invalid],
+        transaction_time=transaction_time[~invalid]
+    )
+    # Primeiro motivo que falhou em cada linha
+    rejected = df.loc[invalid].assign(
+        reject_reason=np.select(
+            [failed for _, failed in checks],
+            [reason for reason, _ in checks],
+            default=''
+        )[invalid]
+    )
+    return valid, rejected
+
+
+def validate_stores(df):
+    """
+    Valida o arquivo de lojas: store_token precisa ser UUID.
+    Retorna (valid, rejected) no mesmo formato de validate_sales.
+    """
+    invalid = ~is_uuid(df['store_token'])
+    valid = df.loc[~invalid].assign(store_token=df['store_token'][~invalid].str.lower())
+    rejected = df.loc[invalid].assign(reject_reason='invalid_store_token')
+    return valid, rejected
@@ -0,0 +1,104 @@
+import os
+import signal
+import time
+
+from src.metrics import metrics
+from src.reporting import REPORTS
+
+# Relatórios afetados por cada tipo de arquivo
+AFFECTED_REPORTS = {
+    'stores': ['top_stores'],
+    'sales': ['batches', 'daily_sales', 'top_stores'],
+}
+
+
+def file_type(filename):
+    if "stores" in filename:
+        return 'stores'
+    if "sales" in filename:
+        return 'sales'
+    return None
+
+
+class InboxWatcher:
+    """
+    Modo contínuo: faz polling do inbox, ingere cada arquivo assim que o
+    tamanho dele para de mudar e regenera só os relatórios afetados.
+    IngestionEngine/ReportGenerator (e o pool de conexões, o cache de lojas
+    e as partições conhecidas) ficam vivos entre um arquivo e outro.
+    """
+
+    def __init__(self, ingestor, reporter, poll_interval=None, settle_seconds=None):
+        cfg = ingestor.db.config.get('watcher') or {}
+        self.ingestor = ingestor
+        self.reporter = reporter
+        self.poll_interval = float(poll_interval or cfg.get('poll_interval', 2))
+        # Arquivo é considerado completo quando o tamanho fica estável por esse tempo
+        self.settle_seconds = float(settle_seconds or cfg.get('settle_seconds', 5))
+        self._seen = {}     # arquivo -> (tamanho, mtime, desde quando está estável)
+        self._failed = {}   # arquivo -> (tamanho, mtime) da versão que falhou
+        self._stop = False
+
+    def stop(self, *args):
+        print("Stopping watcher...")
+        self._stop = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        print(f"Watching {self.ingestor.inbox_path} (poll {self.poll_interval}s, "
+              f"settle {self.settle_seconds}s)")
+        while not self._stop:
+            ready = self._ready_files()
+            if ready:
+                self._process(ready)
+            time.sleep(self.poll_interval)
+
+    def _ready_files(self):
+        now = time.monotonic()
+        ready = []
+        current = set(self.ingestor.list_inbox())
+
+        for name in current:
+            try:
+                st = os.stat(os.path.join(self.ingestor.inbox_path, name))
+            except FileNotFoundError:
+                continue
+            signature = (st.st_size, st.st_mtime)
+            if self._failed.get(name) == signature:
+                # Mesma versão que já falhou: só tenta de novo se o arquivo mudar
+                continue
+
+            previous = self._seen.get(name)
+            if previous is None or previous[:2] != signature:
+                self._seen[name] = signature + (now,)
+            elif now - previous[2] >= self.settle_seconds:
+                ready.append(name)
+
+        # Esquece arquivos que saíram do inbox
+        for name in set(self._seen) - current:
+            del self._seen[name]
+        for name in set(self._failed) - current:
+            del self._failed[name]
+        return sorted(ready)
+
+    def _process(self, files):
+        results = self.ingestor.process_files(files)
+
+        affected = set()
+        for r in results:
+            self._seen.pop(r['file'], None)
+            if r['status'] == 'FAILED':
+                try:
+                    st = os.stat(os.path.join(self.ingestor.inbox_path, r['file']))
+                    self._failed[r['file']] = (st.st_size, st.st_mtime)
+                except FileNotFoundError:
+                    pass
+            elif r['status'] == 'ok':
+                affected.update(AFFECTED_REPORTS.get(file_type(r['file']), []))
+
+        if affected:
+            # Mantém a ordem de declaração dos relatórios
+            names = [name for name in REPORTS if name in affected]
+            self.reporter.generate(names)
+        metrics.write_prometheus()
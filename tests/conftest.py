@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+STORE = "a1b2c3d4-0000-4000-8000-000000000001"
+OTHER_STORE = "a1b2c3d4-0000-4000-8000-000000000002"
+
+
+def tx(n):
+    # transaction_id UUID determinístico
+    return f"00000000-0000-4000-8000-{n:012d}"
+
+
+def sales_frame(rows):
+    # Linhas de vendas como chegam do CSV: tudo texto
+    columns = ['store_token', 'transaction_id', 'receipt_token', 'transaction_time', 'amount', 'user_role']
+    return pd.DataFrame(rows, columns=columns, dtype=object)
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(name, text):
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+    return write
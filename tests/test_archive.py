@@ -0,0 +1,80 @@
+import os
+from datetime import date
+
+import pandas as pd
+
+from conftest import STORE, tx
+from src.archive import SalesArchiveWriter, archived_files, read_archive_chunks
+
+
+def sales(*times):
+    return pd.DataFrame({
+        'store_token': [STORE] * len(times),
+        'transaction_id': [tx(i) for i in range(len(times))],
+        'receipt_token': ["r"] * len(times),
+        'transaction_time': pd.to_datetime(list(times)),
+        'amount': [1.5] * len(times),
+        'user_role': pd.Series(["cashier"] * len(times), dtype='category'),
+        'batch_date': [date(2025, 11, 28)] * len(times),
+    })
+
+
+def parquet_files(root):
+    return sorted(
+        os.path.relpath(os.path.join(d, f), root)
+        for d, _, files in os.walk(root) for f in files
+    )
+
+
+def test_commit_publishes_one_parquet_per_day(tmp_path):
+    root = str(tmp_path)
+    writer = SalesArchiveWriter(root, "sales_20251128")
+    writer.write(sales("2025-11-27 23:00", "2025-11-28 01:00"))
+    writer.write(sales("2025-11-28 02:00"))
+    # Nada visível antes do commit
+    assert archived_files(root, date(2025, 11, 1), date(2025, 11, 30)) == []
+
+    writer.commit()
+    assert parquet_files(root) == [
+        "sales_date=2025-11-27/sales_20251128.parquet",
+        "sales_date=2025-11-28/sales_20251128.parquet",
+    ]
+    day = os.path.join(root, "sales_date=2025-11-28", "sales_20251128.parquet")
+    assert sum(len(chunk) for chunk in read_archive_chunks(day, 10)) == 2
+
+
+def test_abort_removes_temporary_files(tmp_path):
+    root = str(tmp_path)
+    writer = SalesArchiveWriter(root, "sales_20251128")
+    writer.write(sales("2025-11-28 01:00"))
+    writer.abort()
+    assert not any(name.endswith((".parquet", ".tmp")) for name in parquet_files(root))
+
+
+def test_archived_files_filters_days_in_ingestion_order(tmp_path):
+    root = str(tmp_path)
+    for stem, time in [("sales_20251129", "2025-11-28 10:00"), ("sales_20251128", "2025-11-28 09:00"),
+                       ("sales_20251201", "2025-12-01 10:00")]:
+        writer = SalesArchiveWriter(root, stem)
+        writer.write(sales(time))
+        writer.commit()
+    files = archived_files(root, date(2025, 11, 28), date(2025, 11, 30))
+    assert [os.path.basename(p) for p in files] == ["sales_20251128.parquet", "sales_20251129.parquet"]
+
+
+def test_redelivered_file_drops_days_it_no_longer_covers(tmp_path):
+    root = str(tmp_path)
+    first = SalesArchiveWriter(root, "sales_20251128")
+    first.write(sales("2025-11-27 23:00", "2025-11-28 01:00"))
+    first.commit()
+    other = SalesArchiveWriter(root, "sales_20251129")
+    other.write(sales("2025-11-27 22:00"))
+    other.commit()
+
+    again = SalesArchiveWriter(root, "sales_20251128")
+    again.write(sales("2025-11-28 02:00"))
+    again.commit()
+    assert parquet_files(root) == [
+        "sales_date=2025-11-27/sales_20251129.parquet",
+        "sales_date=2025-11-28/sales_20251128.parquet",
+    ]
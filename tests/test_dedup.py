@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from conftest import OTHER_STORE, STORE, tx
+from src.dedup import SalesDeduplicator, key_bytes
+from src.streaming import RowDeduplicator
+
+# (store_token, transaction_id, receipt_token, transaction_time): mesma chave em chunks diferentes
+ROWS = [
+    (STORE, tx(1), "a", "2025-11-28 10:00"),
+    (STORE, tx(2), "b", "2025-11-28 11:00"),
+    (STORE, tx(1).upper(), "c", "2025-11-28 09:00"),
+    (OTHER_STORE, tx(1), "d", "2025-11-28 12:00"),
+    (STORE, tx(2), "e", "2025-11-28 12:00"),
+    (STORE, tx(3), "f", "2025-11-28 13:00"),
+    (STORE, tx(1), "g", "2025-11-28 08:00"),
+]
+
+# Recibos carregados/recusados, duplicatas e válidas (como no sys_batch_log)
+# por regra, independente do tamanho do chunk
+EXPECTED = {
+    'last': ({"d", "e", "f", "g"}, set(), 3, 4),
+    'latest': ({"a", "d", "e", "f"}, set(), 3, 4),
+    'reject': ({"d", "f"}, {"a", "b", "c", "e", "g"}, 5, 2),
+}
+
+
+def frames(chunk_size):
+    df = pd.DataFrame(ROWS, columns=['store_token', 'transaction_id', 'receipt_token', 'transaction_time'])
+    df['transaction_time'] = pd.to_datetime(df['transaction_time'])
+    return [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
+
+
+def run_frames(rule, chunk_size):
+    dedup = SalesDeduplicator(rule)
+    if dedup.needs_prescan:
+        dedup.prescan(frames(chunk_size))
+    # Como no load: uma chave carregada de novo sobrescreve a versão anterior
+    loaded, rejected, duplicates, valid = {}, set(), 0, 0
+    for chunk in frames(chunk_size):
+        kept, refused, n = dedup.apply(chunk)
+        for row in kept.itertuples():
+            loaded[(row.store_token.lower(), row.transaction_id.lower())] = row.receipt_token
+        rejected |= set(refused['receipt_token'])
+        duplicates += n
+        valid += len(kept)
+    return set(loaded.values()), rejected, duplicates, valid - dedup.superseded
+
+
+def run_rows(rule, chunk_size):
+    rows = [(s, t, r, datetime.fromisoformat(ts)) for s, t, r, ts in ROWS]
+    dedup = RowDeduplicator(rule)
+    if dedup.needs_prescan:
+        dedup.prescan((s, t) for s, t, _, _ in rows)
+    loaded, rejected, valid = {}, set(), 0
+    for i in range(0, len(rows), chunk_size):
+        kept, refused = dedup.apply(rows[i:i + chunk_size])
+        for s, t, r, _ in kept:
+            loaded[(s.lower(), t.lower())] = r
+        rejected |= {r for _, _, r, _ in refused}
+        valid += len(kept)
+    return set(loaded.values()), rejected, dedup.duplicates, valid - dedup.superseded
+
+
+@pytest.mark.parametrize("rule", sorted(EXPECTED))
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, len(ROWS)])
+def test_rule_does_not_depend_on_chunk_boundaries(rule, chunk_size):
+    assert run_frames(rule, chunk_size) == EXPECTED[rule]
+    assert run_rows(rule, chunk_size) == EXPECTED[rule]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2])
+def test_latest_compares_years_outside_the_nanosecond_range(chunk_size):
+    rows = [(STORE, tx(1), "new", "2025-11-28 10:00"), (STORE, tx(1), "old", "1500-01-01 10:00")]
+    df = pd.DataFrame(rows, columns=['store_token', 'transaction_id', 'receipt_token', 'transaction_time'])
+    df['transaction_time'] = pd.to_datetime(df['transaction_time'], format='ISO8601')
+    dedup = SalesDeduplicator('latest')
+    kept = [dedup.apply(df.iloc[i:i + chunk_size])[0] for i in range(0, len(df), chunk_size)]
+    assert list(pd.concat(kept)['receipt_token']) == ["new"]
+
+
+def test_reject_requires_prescan():
+    with pytest.raises(RuntimeError):
+        SalesDeduplicator('reject').apply(frames(len(ROWS))[0])
+
+
+def test_key_bytes_is_the_exact_uuid_pair():
+    df = pd.DataFrame({'store_token': [STORE, STORE.upper()], 'transaction_id': [tx(1), tx(1)]})
+    keys = key_bytes(df)
+    assert keys[0] == keys[1]
+    assert keys[0] == bytes.fromhex((STORE + tx(1)).replace('-', ''))
+
+
+def test_unknown_rule_is_refused():
+    with pytest.raises(ValueError):
+        SalesDeduplicator('first')
@@ -0,0 +1,10 @@
+from src.metrics import _prom_labels
+
+
+def test_prom_labels_escape_quotes_backslashes_and_newlines():
+    labels = [('file', 'sales "a"\\b\nc.csv'), ('status', 'ok')]
+    assert _prom_labels(labels) == '{file="sales \\"a\\"\\\\b\\nc.csv",status="ok"}'
+
+
+def test_prom_labels_empty():
+    assert _prom_labels(()) == ""
@@ -0,0 +1,29 @@
+from src.reporting import REPORTS, ReportGenerator
+
+
+class FakeDatabase:
+    def __init__(self, reporting=None):
+        self.config = {'reporting': reporting or {'cache': False, 'workers': 1}}
+
+
+def generator(tmp_path, monkeypatch, failing=()):
+    monkeypatch.chdir(tmp_path)
+    reporter = ReportGenerator(db=FakeDatabase())
+    monkeypatch.setattr(reporter, '_save_csv', lambda query, filename: filename not in failing)
+    return reporter
+
+
+def test_generate_reports_success(tmp_path, monkeypatch):
+    assert generator(tmp_path, monkeypatch).generate(REPORTS) is True
+
+
+def test_generate_reports_failure(tmp_path, monkeypatch):
+    reporter = generator(tmp_path, monkeypatch, failing={"output_2_daily_sales.csv"})
+    assert reporter.generate(REPORTS) is False
+
+
+def test_backfill_filenames_carry_the_date_range(tmp_path, monkeypatch):
+    from datetime import date
+    monkeypatch.chdir(tmp_path)
+    reporter = ReportGenerator(db=FakeDatabase(), date_from=date(2025, 11, 1), date_to=date(2025, 11, 30))
+    assert [f for _, f in reporter.queries(['daily_sales'])] == ["output_2_daily_sales_20251101_20251130.csv"]
@@ -0,0 +1,116 @@
+import csv
+import gzip
+import math
+
+import pandas as pd
+import pytest
+
+from conftest import STORE, tx
+from src.ingestion import IngestionEngine
+from src.readers import read_chunks
+from src.schema import SALES_SCHEMA
+from src.streaming import RowDeduplicator, RowsWriter, open_text, parse_amount, parse_time, reject_reason
+from src.validation import validate_sales
+
+class FakeDatabase:
+    def __init__(self, ingestion):
+        self.config = {'ingestion': ingestion}
+
+
+HEADER = "store_token,transaction_id,receipt_token,transaction_time,amount,user_role\n"
+
+# Formatos variados de transaction_time/amount; o mesmo arquivo passa pelos dois parsers
+LINES = [
+    f"{STORE},{tx(1)},r1,2025-11-28 10:00:00,$63.98,cashier",
+    f"{STORE},{tx(2)},r2,2025-11-28T10:00:00.5,10,cashier",
+    f"{STORE},{tx(3)},r3,2025-11-28 10:00,1.5,cashier",
+    f"{STORE},{tx(4)},r4,2025-11-28,2,cashier",
+    f"{STORE},{tx(5)},r5,2025-11-28T10:00:00Z,3,cashier",
+    f"{STORE},{tx(6)},r6,2025-11-28 10:00:00.1234567-03:00,4,cashier",
+    f"{STORE},{tx(7)},r7, 2025-11-28 10:00:00 ,5,cashier",
+    f"{STORE},{tx(8)},r8,28/11/2025 10:00,6,cashier",
+    f"{STORE},{tx(9)},r9,2025-11-28 10:00:001,7,cashier",
+    f"{STORE},{tx(10)},r10,2025-02-30 10:00:00,8,cashier",
+    f"{STORE},{tx(11)},r11,,9,cashier",
+    f"{STORE},{tx(12)},r12,2025-11-28 10:00:00,abc,cashier",
+    f"{STORE},{tx(13)},r13,2025-11-28 10:00:00,1e20,cashier",
+    f"{STORE},{tx(14)},r14,2025-11-28 10:00:00,inf,cashier",
+    f"not-a-uuid,{tx(15)},r15,2025-11-28 10:00:00,1,cashier",
+    f"{STORE},{tx(16)},r16,2025-11-28 10:00:00,-0.01,cashier",
+]
+
+
+def pandas_results(path, chunk_size):
+    # transaction_id -> (reject_reason, transaction_time, amount) pelo caminho pandas
+    out = {}
+    for chunk in read_chunks(path, SALES_SCHEMA, chunk_size):
+        valid, rejected = validate_sales(chunk)
+        for row in valid.itertuples():
+            out[row.transaction_id] = (None, row.transaction_time.to_pydatetime(), row.amount)
+        for row in rejected.itertuples():
+            out[row.transaction_id] = (row.reject_reason, None, None)
+    return out
+
+
+def stream_results(path):
+    # Mesmo dicionário pelo caminho sem pandas (src/streaming.py)
+    out = {}
+    with open_text(path) as f:
+        for row in csv.DictReader(f):
+            ts, amount = parse_time(row['transaction_time']), parse_amount(row['amount'])
+            reason = reject_reason(row['store_token'], row['transaction_id'], ts, amount)
+            out[row['transaction_id']] = (reason, None, None) if reason else (None, ts, amount)
+    return out
+
+
+def assert_same(left, right):
+    assert left.keys() == right.keys()
+    for key in left:
+        (reason_a, ts_a, amount_a), (reason_b, ts_b, amount_b) = left[key], right[key]
+        assert (reason_a, ts_a) == (reason_b, ts_b), key
+        assert amount_a == amount_b or math.isclose(amount_a, amount_b)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_parsers_agree_on_the_same_file(write_csv, chunk_size):
+    path = write_csv("sales.csv", HEADER + "\n".join(LINES) + "\n")
+    streamed = stream_results(path)
+    assert_same(pandas_results(path, chunk_size), streamed)
+    assert streamed[tx(6)][1] == pd.Timestamp("2025-11-28 10:00:00.123456").to_pydatetime()
+    assert {tx(n): streamed[tx(n)][0] for n in (8, 9, 10, 12, 13, 15)} == {
+        tx(8): 'invalid_transaction_time', tx(9): 'invalid_transaction_time',
+        tx(10): 'invalid_transaction_time', tx(12): 'invalid_amount',
+        tx(13): 'invalid_amount', tx(15): 'invalid_store_token',
+    }
+
+
+def test_parsers_agree_on_header_with_bom(tmp_path):
+    path = str(tmp_path / "sales_bom.csv.gz")
+    with gzip.open(path, "wt", encoding="utf-8-sig") as f:
+        f.write(HEADER + "\n".join(LINES[:4]) + "\n")
+    streamed = stream_results(path)
+    assert all(reason is None for reason, _, _ in streamed.values())
+    assert_same(pandas_results(path, 2), streamed)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_rows_with_another_field_count_are_rejected_not_realigned(tmp_path, chunk_size):
+    (tmp_path / "sales_20251128.csv").write_text(HEADER + "\n".join([
+        LINES[0],
+        f"{STORE},{tx(20)},r20,2025-11-28 10:00:00,$12,34.5,cashier",
+        f"{STORE},{tx(21)},r21,2025-11-28 10:00:00",
+        LINES[1],
+    ]) + "\n", encoding="utf-8")
+    engine = IngestionEngine(db=FakeDatabase({'parser': 'csv', 'chunk_size': chunk_size}))
+    engine.inbox_path = str(tmp_path)
+    rejected = RowsWriter(str(tmp_path / "rejected.csv"), list(SALES_SCHEMA) + ['reject_reason'])
+    dedup, kept = RowDeduplicator('last'), []
+    for rows, malformed in engine._read_stream_chunks("sales_20251128.csv"):
+        kept += engine._clean_stream_chunk("sales_20251128.csv", rows, malformed, {STORE}, set(),
+                                           dedup, rejected, None)[0]
+    rejected.close()
+    assert [row[1] for row in kept] == [tx(1), tx(2)]
+    with open(rejected.path, newline="") as f:
+        assert [(row['transaction_id'], row['reject_reason']) for row in csv.DictReader(f)] == [
+            (tx(20), 'malformed_row'), (tx(21), 'malformed_row'),
+        ]
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from conftest import STORE, sales_frame, tx
+from src.validation import MAX_AMOUNT, parse_amount, validate_sales, validate_stores
+
+
+def test_parse_amount_strips_currency_and_coerces_invalid():
+    parsed = parse_amount(pd.Series(["$63.98", " 10 ", "N/A", ""]))
+    assert parsed.iloc[0] == 63.98
+    assert parsed.iloc[1] == 10.0
+    assert parsed.iloc[2:].isna().all()
+
+
+def test_validate_sales_converts_valid_rows():
+    valid, rejected = validate_sales(sales_frame([
+        [STORE, tx(1), "r1", "2025-11-28 10:15:00", "$63.98", "cashier"],
+    ]))
+    assert rejected.empty
+    assert valid['amount'].iloc[0] == 63.98
+    assert valid['transaction_time'].iloc[0] == pd.Timestamp("2025-11-28 10:15:00")
+
+
+def test_validate_sales_reports_first_failed_rule():
+    valid, rejected = validate_sales(sales_frame([
+        ["not-a-uuid", "also-bad", "r1", "yesterday", "N/A", "cashier"],
+        [STORE, "bad-id", "r2", "yesterday", "N/A", "cashier"],
+        [STORE, tx(3), "r3", "yesterday", "N/A", "cashier"],
+        [STORE, tx(4), "r4", "2025-11-28 10:00:00", "N/A", "cashier"],
+        [STORE, tx(5), "r5", "2025-11-28 10:00:00", f"{MAX_AMOUNT}", "cashier"],
+        [STORE, tx(6), "r6", "2025-11-28 10:00:00", "$1.00", "cashier"],
+    ]))
+    assert list(rejected['reject_reason']) == [
+        'invalid_store_token', 'invalid_transaction_id', 'invalid_transaction_time',
+        'invalid_amount', 'invalid_amount',
+    ]
+    assert list(valid['transaction_id']) == [tx(6)]
+
+
+def test_validate_sales_keeps_original_text_in_rejected():
+    _, rejected = validate_sales(sales_frame([
+        [STORE, tx(1), "r1", "2025-11-28 10:00:00", "N/A", "cashier"],
+    ]))
+    assert rejected['amount'].iloc[0] == "N/A"
+    assert rejected['transaction_time'].iloc[0] == "2025-11-28 10:00:00"
+
+
+def test_validate_stores_rejects_bad_tokens_and_lowercases():
+    stores = pd.DataFrame({
+        'store_group': ["g1", "g1"],
+        'store_token': [STORE.upper(), "nope"],
+        'store_name': ["Loja 1", "Loja 2"],
+    })
+    valid, rejected = validate_stores(stores)
+    assert list(valid['store_token']) == [STORE]
+    assert list(rejected['reject_reason']) == ['invalid_store_token']